@@ -1,5 +1,5 @@
 """Simple spam analysis module for Outreach AI emails."""
-from typing import Tuple
+from typing import FrozenSet, Iterable, NamedTuple, Tuple
 
 
 TRIGGER_WORDS = {
@@ -8,40 +8,97 @@ TRIGGER_WORDS = {
 }
 
 
-def spam_score(subject: str, body: str) -> Tuple[int, str]:
-    """Compute a basic spam score and return a summary of findings.
+class SpamFeatures(NamedTuple):
+    """Raw spam signals extracted from a piece of text.
 
-    The score is based on the number of exclamation points, uppercase words,
-    and presence of known trigger words.
+    Features from separate fragments of a message can be merged with
+    :func:`combine_features` and scored with :func:`score_features`, which
+    lets unchanged fragments be analyzed once and reused.
+    """
+
+    exclamations: int = 0
+    uppercase_words: int = 0
+    triggers: FrozenSet[str] = frozenset()
+
+
+def extract_features(text: str) -> SpamFeatures:
+    """Extract spam signals from ``text``.
 
     Args:
-        subject: Email subject line.
-        body: Email body text.
+        text: Any fragment of email text.
 
     Returns:
-        A tuple of (score, explanation) where score is an integer and
-        explanation is a human-readable summary.
+        The exclamation count, the number of uppercase words longer than
+        three characters, and the trigger words found.
+    """
+    uppercase_words = [word for word in text.split() if word.isupper() and len(word) > 3]
+    lowered = text.lower()
+    return SpamFeatures(
+        exclamations=text.count("!"),
+        uppercase_words=len(uppercase_words),
+        triggers=frozenset(w for w in TRIGGER_WORDS if w in lowered),
+    )
+
+
+def combine_features(features: Iterable[SpamFeatures]) -> SpamFeatures:
+    """Merge features from several fragments of the same message.
+
+    Counts are summed and trigger words are unioned, since each trigger
+    word contributes to the score once no matter how often it appears.
+    """
+    exclamations = 0
+    uppercase_words = 0
+    triggers: FrozenSet[str] = frozenset()
+    for item in features:
+        exclamations += item.exclamations
+        uppercase_words += item.uppercase_words
+        triggers |= item.triggers
+    return SpamFeatures(exclamations, uppercase_words, triggers)
+
+
+def score_features(features: SpamFeatures) -> Tuple[int, str]:
+    """Turn extracted features into a score and explanation.
+
+    Args:
+        features: Signals for a whole message.
+
+    Returns:
+        A tuple of (score, explanation) as returned by :func:`spam_score`.
     """
     score = 0
     explanations = []
 
-    # Count exclamation marks
-    exclamations = subject.count("!") + body.count("!")
-    if exclamations:
-        score += exclamations
-        explanations.append(f"{exclamations} exclamation point(s)")
+    if features.exclamations:
+        score += features.exclamations
+        explanations.append(f"{features.exclamations} exclamation point(s)")
 
-    # Count uppercase words
-    uppercase_words = [word for word in body.split() if word.isupper() and len(word) > 3]
-    if uppercase_words:
-        score += len(uppercase_words)
-        explanations.append(f"{len(uppercase_words)} uppercase word(s)")
+    if features.uppercase_words:
+        score += features.uppercase_words
+        explanations.append(f"{features.uppercase_words} uppercase word(s)")
 
-    # Trigger words
-    found_triggers = [w for w in TRIGGER_WORDS if w in body.lower()]
-    if found_triggers:
-        score += len(found_triggers)
-        explanations.append(f"trigger words: {', '.join(found_triggers)}")
+    if features.triggers:
+        score += len(features.triggers)
+        explanations.append(f"trigger words: {', '.join(sorted(features.triggers))}")
 
     explanation = "; ".join(explanations) if explanations else "No issues detected"
     return score, explanation
+
+
+def spam_score(subject: str, body: str) -> Tuple[int, str]:
+    """Compute a basic spam score and return a summary of findings.
+
+    The score is based on the number of exclamation points, uppercase words,
+    and presence of known trigger words.
+
+    Args:
+        subject: Email subject line.
+        body: Email body text.
+
+    Returns:
+        A tuple of (score, explanation) where score is an integer and
+        explanation is a human-readable summary.
+    """
+    # Only exclamation marks are counted in the subject line.
+    features = extract_features(body)
+    features = features._replace(exclamations=features.exclamations + subject.count("!"))
+    return score_features(features)
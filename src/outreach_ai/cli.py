@@ -7,12 +7,16 @@ added later for sender management, recipient import, campaign creation, running
 campaigns, and delivery loops.
 """
 
+from typing import Optional
+
 import typer
 import uvicorn
 
-from .db import engine
-from .models import Base
+from .db import SessionLocal, engine
+from .models import Base, Campaign, Message, Recipient, Sender
 from .app import app as fastapi_app
+from .preflight import run_preflight
+from .variants import RECIPIENT_FIELDS, SnippetCache, VariantEngine, segment_key
 
 cli = typer.Typer(help="Command-line interface for Outreach AI")
 
@@ -42,6 +46,80 @@ def deliver_loop() -> None:
     """
     typer.echo("Delivery loop not yet implemented.")
 
+@cli.command()
+def campaign_preflight(
+    campaign_id: int = typer.Argument(..., help="Campaign to check."),
+    threshold: int = typer.Option(5, help="Spam scores above this flag a message."),
+    max_flagged: float = typer.Option(
+        0.0, help="Largest share of flagged messages that still passes."
+    ),
+    worst: int = typer.Option(10, help="Number of worst-scoring recipients to list."),
+    sender_company: Optional[str] = typer.Option(
+        None, help="Value for the sender_company template field."
+    ),
+    snippet_cache_dir: Optional[str] = typer.Option(
+        None,
+        envvar="VARIANT_CACHE_DIR",
+        help="Directory of cached AI snippets to reuse. Without it nothing is written to disk.",
+    ),
+) -> None:
+    """Score a campaign's queued messages for spam signals before launch.
+
+    Each message is scored with its recipient's fields, its sender's name
+    and address, and the AI snippets for the recipient's segment. Exits with
+    status 1 if the campaign fails the gate, so it can guard a scripted
+    launch.
+    """
+    cache = SnippetCache(snippet_cache_dir) if snippet_cache_dir else None
+    variant_engine = VariantEngine(cache=cache)
+    with SessionLocal() as session:
+        campaign = session.get(Campaign, campaign_id)
+        if campaign is None:
+            typer.echo(f"Campaign {campaign_id} not found.")
+            raise typer.Exit(code=1)
+        try:
+            with open(campaign.template_path, encoding="utf-8") as handle:
+                body = handle.read()
+        except OSError as exc:
+            typer.echo(f"Template {campaign.template_path} could not be read: {exc.strerror}.")
+            raise typer.Exit(code=1)
+
+        rows = (
+            session.query(Recipient, Sender)
+            .join(Message, Message.recipient_id == Recipient.id)
+            .outerjoin(Sender, Sender.id == Message.sender_id)
+            .filter(
+                Message.campaign_id == campaign_id,
+                Message.status == "pending",
+                Recipient.suppressed.isnot(True),
+            )
+            .yield_per(500)
+        )
+
+        def contexts():
+            for recipient, sender in rows:
+                context = dict(variant_engine.snippets_for(segment_key(recipient)))
+                if sender is not None:
+                    context["sender_name"] = sender.name
+                    context["sender_email"] = sender.email
+                if sender_company is not None:
+                    context["sender_company"] = sender_company
+                context.update({name: getattr(recipient, name) for name in RECIPIENT_FIELDS})
+                yield context
+
+        report = run_preflight(
+            campaign.subject or "",
+            body,
+            contexts(),
+            threshold=threshold,
+            max_flagged_ratio=max_flagged,
+            worst=worst,
+        )
+
+    typer.echo(report.summary())
+    if not report.passed:
+        raise typer.Exit(code=1)
+
 def main() -> None:
     """Main entry point for the CLI."""
     cli()
@@ -12,7 +12,7 @@ return derived statistics.
 
 from __future__ import annotations
 
-from typing import Iterable, List, Mapping, Dict
+from typing import Iterable, List, Mapping, Dict, Optional
 
 
 def success_percentage(total_sent: int, delivered: int) -> float:
@@ -96,6 +96,41 @@ def moving_average(data: List[float], window_size: int = 3) -> List[float]:
     return avgs
 
 
+def variant_performance(session, campaign_id: Optional[int] = None) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Summarize A/B variant results from the messages table.
+
+    Args:
+        session: SQLAlchemy session.
+        campaign_id: Restrict to one campaign; all campaigns if ``None``.
+
+    Returns:
+        A mapping with ``"subject"`` and ``"body"`` entries, each mapping a
+        variant label to its ``sent`` count, ``open_rate`` and ``reply_rate``.
+    """
+    from .models import Message
+
+    report: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for dimension, column in (("subject", Message.subject_variant), ("body", Message.body_variant)):
+        query = session.query(column, Message.opened_at, Message.replied_at).filter(
+            column.isnot(None)
+        )
+        if campaign_id is not None:
+            query = query.filter(Message.campaign_id == campaign_id)
+
+        counts: Dict[str, List[int]] = {}
+        for label, opened_at, replied_at in query:
+            totals = counts.setdefault(label, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += opened_at is not None
+            totals[2] += replied_at is not None
+
+        report[dimension] = {}
+        for label, (sent, opens, replies) in sorted(counts.items()):
+            rates = engagement_rate(sent, opens, replies)
+            report[dimension][label] = {"sent": sent, **rates}
+    return report
+
+
 def render_dashboard(session):
     """
     Generate an HTML dashboard summary using the database session.
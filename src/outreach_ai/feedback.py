@@ -0,0 +1,479 @@
+"""Bounce and deferral feedback for outbound mail.
+
+This module classifies SMTP responses and delivery status notifications
+(DSNs) into hard bounces, soft bounces and throttling deferrals. The
+outcomes feed a :class:`FeedbackLoop` which suppresses hard-bounced
+addresses, keeps rolling health scores per sender and per recipient domain,
+and adapts the send rate for each destination domain using AIMD
+(additive-increase, multiplicative-decrease) backoff.
+
+Nothing here talks to an SMTP server directly. :func:`send_with_feedback`
+wraps any ``send_email``-compatible coroutine, which makes the loop easy to
+exercise against a local stub that injects deferrals.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import email
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# Outcome labels returned by the classifiers.
+DELIVERED = "delivered"
+HARD = "hard"
+SOFT = "soft"
+THROTTLE = "throttle"
+
+# Phrases that providers use when deferring or rejecting because of volume.
+THROTTLE_PATTERNS = re.compile(
+    r"rate limit|too many|throttl|try again later|temporarily deferred|"
+    r"limit exceeded|unusual rate|slow down|reduce your send",
+    re.IGNORECASE,
+)
+
+# Permanent failures that indicate a problem with the mailbox itself.
+HARD_PATTERNS = re.compile(
+    r"user unknown|no such user|does not exist|unknown recipient|"
+    r"mailbox unavailable|address rejected|invalid recipient|recipient not found",
+    re.IGNORECASE,
+)
+
+# Consumer domains that share mail infrastructure with a larger provider.
+PROVIDER_ALIASES: Dict[str, str] = {
+    "googlemail.com": "gmail.com",
+    "hotmail.com": "outlook.com",
+    "live.com": "outlook.com",
+    "msn.com": "outlook.com",
+    "ymail.com": "yahoo.com",
+    "rocketmail.com": "yahoo.com",
+}
+
+# An RFC 3463 status is only trusted at the start of the reply text, after an
+# optional echo of the reply code; elsewhere it is likely part of an IP address.
+ENHANCED_STATUS = re.compile(r"^\s*(?:[245]\d\d[ -]\s*)?([245])\.(\d{1,3})\.(\d{1,3})\b")
+
+
+def recipient_domain(address: str) -> str:
+    """Return the lower-cased domain part of an email address."""
+    return address.rsplit("@", 1)[-1].strip().strip(">").lower()
+
+
+def destination_key(address: str) -> str:
+    """Return the key a recipient's domain is tracked under.
+
+    Consumer domains in :data:`PROVIDER_ALIASES` fold onto their provider,
+    so ``googlemail.com`` and ``gmail.com`` share one rate and health score.
+    """
+    domain = recipient_domain(address)
+    return PROVIDER_ALIASES.get(domain, domain)
+
+
+def classify_smtp_response(code: int, message: str = "") -> str:
+    """Classify an SMTP reply into a delivery outcome.
+
+    An enhanced status code (RFC 3463) at the start of ``message`` takes
+    precedence over the basic reply code when its class matches the reply
+    code's. Replies with a code of 400 or above are never reported as
+    delivered. Volume-related wording is treated as
+    throttling regardless of whether the reply is transient or permanent,
+    since several large providers reject with ``5xx`` when rate limiting.
+
+    Args:
+        code: The three-digit SMTP reply code.
+        message: The reply text returned by the server.
+
+    Returns:
+        One of ``"delivered"``, ``"hard"``, ``"soft"`` or ``"throttle"``.
+    """
+    if 200 <= code < 400:
+        return DELIVERED
+
+    enhanced = ENHANCED_STATUS.match(message or "")
+    if enhanced and int(enhanced.group(1)) != code // 100:
+        enhanced = None
+    # A full mailbox affects one recipient only; it must neither suppress the
+    # address nor slow down the whole domain, whatever the wording says.
+    if enhanced and enhanced.group(2, 3) == ("2", "2"):
+        return SOFT
+
+    if THROTTLE_PATTERNS.search(message or ""):
+        return THROTTLE
+
+    if enhanced:
+        klass, subject, detail = (int(part) for part in enhanced.groups())
+        if klass == 4 and (subject == 7 or (subject == 4 and detail == 5)):
+            # Transient policy (X.7.x) and mail system congestion (X.4.5).
+            return THROTTLE
+        if klass == 5 and subject == 1:
+            return HARD
+        # Policy rejections say nothing about whether the address exists,
+        # so they must not trigger suppression.
+        if subject == 7:
+            return SOFT
+        return HARD if klass == 5 else SOFT
+
+    if code == 421:
+        # 421 closes the channel; without more detail, read it as congestion.
+        return THROTTLE
+    if code >= 500:
+        if code in (550, 551, 553) or HARD_PATTERNS.search(message or ""):
+            return HARD
+        return SOFT
+    return SOFT
+
+
+def classify_exception(exc: BaseException) -> str:
+    """Classify an exception raised by an SMTP client.
+
+    ``aiosmtplib`` response errors carry ``code`` and ``message``
+    attributes; recipient refusals carry a ``recipients`` list of such
+    errors. Anything without a reply code (connection resets, timeouts) is
+    treated as a soft failure.
+
+    Args:
+        exc: The exception raised while sending.
+
+    Returns:
+        The outcome label for the failure.
+    """
+    refused = getattr(exc, "recipients", None)
+    if refused:
+        outcomes = [classify_exception(item) for item in refused]
+        for outcome in (HARD, THROTTLE, SOFT):
+            if outcome in outcomes:
+                return outcome
+
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return classify_smtp_response(code, str(getattr(exc, "message", "")))
+    return SOFT
+
+
+def parse_dsn(raw: str) -> List[Tuple[str, str, str]]:
+    """Extract per-recipient outcomes from a delivery status notification.
+
+    Args:
+        raw: The full RFC 3464 bounce message as a string.
+
+    Returns:
+        A list of ``(recipient, outcome, diagnostic)`` tuples, one for each
+        recipient block in the ``message/delivery-status`` part. Recipients
+        with ``Action: delivered`` or ``relayed`` are reported as delivered.
+    """
+    results: List[Tuple[str, str, str]] = []
+    message = email.message_from_string(raw)
+    for part in message.walk():
+        if part.get_content_type() != "message/delivery-status":
+            continue
+        payload = part.get_payload()
+        # The first block holds per-message fields; the rest are recipients.
+        blocks = payload[1:] if isinstance(payload, list) else []
+        for block in blocks:
+            recipient = block.get("Final-Recipient") or block.get("Original-Recipient")
+            if not recipient:
+                continue
+            address = recipient.split(";", 1)[-1].strip()
+            action = (block.get("Action") or "").strip().lower()
+            status = (block.get("Status") or "").strip()
+            diagnostic = (block.get("Diagnostic-Code") or "").split(";", 1)[-1].strip()
+
+            if action in ("delivered", "relayed", "expanded"):
+                outcome = DELIVERED
+            else:
+                code_match = re.search(r"\b([245]\d\d)\b", diagnostic)
+                code = int(code_match.group(1)) if code_match else (
+                    550 if status.startswith("5") else 450
+                )
+                outcome = classify_smtp_response(code, f"{status} {diagnostic}")
+                if action == "delayed" and outcome == HARD:
+                    outcome = SOFT
+            results.append((address, outcome, diagnostic))
+    return results
+
+
+class HealthScore:
+    """Exponentially weighted success rate for a sender or domain.
+
+    A score of ``1.0`` means every recent attempt succeeded. Soft failures
+    count as half a failure so that transient problems do not drag the
+    score down as quickly as bounces and throttling do.
+    """
+
+    PENALTY = {DELIVERED: 0.0, SOFT: 0.5, HARD: 1.0, THROTTLE: 1.0}
+
+    def __init__(self, alpha: float = 0.1) -> None:
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        self.alpha = alpha
+        self.score = 1.0
+        self.attempts = 0
+
+    def record(self, outcome: str) -> float:
+        """Fold an outcome into the score and return the new value."""
+        sample = 1.0 - self.PENALTY.get(outcome, 0.5)
+        self.score = (1 - self.alpha) * self.score + self.alpha * sample
+        self.attempts += 1
+        return self.score
+
+
+class AIMDRate:
+    """Per-domain send rate adjusted by additive increase, multiplicative decrease.
+
+    The rate is expressed in messages per minute. Each successful delivery
+    raises it by ``increase``; each throttle response multiplies it by
+    ``decrease``. Other failures leave it unchanged: bounces and full
+    mailboxes concern one recipient, and authentication errors or dropped
+    connections concern the sender, not the destination's capacity.
+    """
+
+    def __init__(
+        self,
+        initial: float = 30.0,
+        minimum: float = 1.0,
+        maximum: float = 600.0,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+    ) -> None:
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1")
+        if minimum <= 0 or maximum < minimum:
+            raise ValueError("require 0 < minimum <= maximum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.rate = min(max(initial, minimum), maximum)
+        self.next_allowed = 0.0
+
+    def record(self, outcome: str) -> float:
+        """Adjust the rate for an outcome and return the new rate."""
+        if outcome == DELIVERED:
+            self.rate += self.increase
+        elif outcome == THROTTLE:
+            self.rate *= self.decrease
+        self.rate = min(max(self.rate, self.minimum), self.maximum)
+        return self.rate
+
+    @property
+    def interval(self) -> float:
+        """Seconds between consecutive sends at the current rate."""
+        return 60.0 / self.rate
+
+    def reserve(self, now: float, not_before: float = 0.0) -> float:
+        """Reserve the next send slot and return how long to wait for it.
+
+        Args:
+            now: Current monotonic time in seconds.
+            not_before: Earliest time the caller can send, e.g. because its
+                own sender is being held back.
+        """
+        start = max(now, self.next_allowed, not_before)
+        self.next_allowed = start + self.interval
+        return start - now
+
+
+class FeedbackLoop:
+    """Track delivery outcomes and adapt sending behaviour.
+
+    Args:
+        initial_rate: Starting messages per minute for an unseen domain.
+        min_rate: Floor for the per-domain rate.
+        max_rate: Ceiling for the per-domain rate.
+        alpha: Smoothing factor for the health scores.
+        min_sender_score: Floor applied to a sender's health when scaling
+            its send interval, bounding the slowdown.
+        clock: Monotonic clock, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial_rate: float = 30.0,
+        min_rate: float = 1.0,
+        max_rate: float = 600.0,
+        alpha: float = 0.1,
+        min_sender_score: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.alpha = alpha
+        self.min_sender_score = min_sender_score
+        self.clock = clock
+        self.suppressed: Set[str] = set()
+        self.sender_health: Dict[str, HealthScore] = {}
+        self.domain_health: Dict[str, HealthScore] = {}
+        self.domain_rates: Dict[str, AIMDRate] = {}
+        self._sender_next: Dict[Tuple[str, str], float] = {}
+        self._pending_suppressions: Dict[str, str] = {}
+
+    def rate_for(self, domain: str, initial: Optional[float] = None) -> AIMDRate:
+        """Return the AIMD controller for ``domain``, creating it if needed.
+
+        Args:
+            domain: Destination domain or provider key.
+            initial: Starting rate if the controller is created by this call.
+                Defaults to the loop's ``initial_rate``.
+        """
+        domain = domain.lower()
+        controller = self.domain_rates.get(domain)
+        if controller is None:
+            controller = AIMDRate(
+                initial=self.initial_rate if initial is None else initial,
+                minimum=self.min_rate,
+                maximum=self.max_rate,
+            )
+            self.domain_rates[domain] = controller
+        return controller
+
+    def is_suppressed(self, address: str) -> bool:
+        """Return ``True`` if ``address`` has hard-bounced."""
+        return address.strip().lower() in self.suppressed
+
+    def sender_score(self, sender: str) -> float:
+        """Return the health score for ``sender`` (``1.0`` if unseen)."""
+        health = self.sender_health.get(sender.lower())
+        return health.score if health else 1.0
+
+    def domain_score(self, domain: str) -> float:
+        """Return the health score for ``domain`` (``1.0`` if unseen)."""
+        health = self.domain_health.get(domain.lower())
+        return health.score if health else 1.0
+
+    def delay_for(
+        self, recipient: str, sender: str = "", domain: Optional[str] = None
+    ) -> float:
+        """Reserve a send slot for ``recipient`` and return the wait in seconds.
+
+        Slots for the destination are spaced by its AIMD rate. Each sender
+        also has its own next-slot time per destination, spaced further apart
+        as its health score drops, so a mailbox that keeps bouncing sends
+        more slowly without holding back healthy senders.
+
+        Args:
+            recipient: Recipient address.
+            sender: Sending mailbox address.
+            domain: Destination key, as passed to :meth:`record`. Defaults to
+                :func:`destination_key` of the recipient.
+        """
+        domain = (domain or destination_key(recipient)).lower()
+        controller = self.rate_for(domain)
+        key = (sender.lower(), domain)
+        now = self.clock()
+        delay = controller.reserve(now, self._sender_next.get(key, 0.0))
+        scale = 1.0 / max(self.sender_score(sender), self.min_sender_score)
+        self._sender_next[key] = now + delay + controller.interval * scale
+        return delay
+
+    def record(
+        self,
+        sender: str,
+        recipient: str,
+        outcome: str,
+        reason: str = "",
+        domain: Optional[str] = None,
+    ) -> None:
+        """Record the outcome of a single delivery attempt.
+
+        Args:
+            sender: Sending mailbox address.
+            recipient: Recipient address.
+            outcome: One of the outcome labels from this module.
+            reason: Optional diagnostic text, stored with suppressions.
+            domain: Key to track the destination under. Defaults to
+                :func:`destination_key` of the recipient; callers with their
+                own grouping pass their key instead.
+        """
+        domain = (domain or destination_key(recipient)).lower()
+        self.sender_health.setdefault(sender.lower(), HealthScore(self.alpha)).record(outcome)
+        self.domain_health.setdefault(domain, HealthScore(self.alpha)).record(outcome)
+        self.rate_for(domain).record(outcome)
+
+        if outcome == HARD:
+            address = recipient.strip().lower()
+            if address not in self.suppressed:
+                self.suppressed.add(address)
+                self._pending_suppressions[address] = reason or "hard bounce"
+
+    def record_dsn(self, sender: str, raw: str) -> List[Tuple[str, str, str]]:
+        """Parse a bounce message and record each recipient's outcome."""
+        results = parse_dsn(raw)
+        for recipient, outcome, diagnostic in results:
+            self.record(sender, recipient, outcome, diagnostic)
+        return results
+
+    def persist_suppressions(self, session) -> int:
+        """Write newly hard-bounced addresses to the suppression list.
+
+        Adds a :class:`~outreach_ai.models.Suppression` row for each address
+        and marks matching recipients as suppressed. The caller is
+        responsible for committing the session.
+
+        Args:
+            session: SQLAlchemy session.
+
+        Returns:
+            The number of addresses written.
+        """
+        from .models import Recipient, Suppression
+
+        written = 0
+        for address, reason in self._pending_suppressions.items():
+            if session.query(Suppression).filter(Suppression.email == address).first() is None:
+                session.add(Suppression(email=address, reason=f"bounce: {reason}"[:255]))
+                written += 1
+            session.query(Recipient).filter(Recipient.email == address).update(
+                {Recipient.suppressed: True}, synchronize_session=False
+            )
+        self._pending_suppressions.clear()
+        return written
+
+
+async def send_with_feedback(
+    loop: FeedbackLoop,
+    *,
+    send: Optional[Callable[..., Awaitable[None]]] = None,
+    sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    **kwargs,
+) -> str:
+    """Send one email while honouring and updating the feedback loop.
+
+    Suppressed recipients are skipped. Otherwise the call waits for the
+    destination domain's next send slot, delivers via ``send`` and records
+    the classified outcome. SMTP errors are swallowed and reported through
+    the return value so callers can requeue soft failures.
+
+    Args:
+        loop: The feedback loop to consult and update.
+        send: Coroutine with the signature of
+            :func:`outreach_ai.senders.send_email`. Defaults to that function.
+        sleep: Coroutine used to wait for a send slot.
+        **kwargs: Keyword arguments passed through to ``send``.
+
+    Returns:
+        The outcome label, or ``"suppressed"`` if the send was skipped.
+    """
+    recipient = kwargs["recipient"]
+    sender = kwargs.get("sender_email", "")
+    if loop.is_suppressed(recipient):
+        return "suppressed"
+
+    if send is None:
+        from .senders import send_email as send
+
+    delay = loop.delay_for(recipient, sender)
+    if delay > 0:
+        await sleep(delay)
+
+    try:
+        await send(**kwargs)
+    except Exception as exc:  # noqa: BLE001 - every failure is classified
+        outcome = classify_exception(exc)
+        loop.record(sender, recipient, outcome, str(getattr(exc, "message", exc)))
+        return outcome
+
+    loop.record(sender, recipient, DELIVERED)
+    return DELIVERED
@@ -55,6 +55,8 @@ class Message(Base):
     clicked_at = Column(DateTime, nullable=True)
     replied_at = Column(DateTime, nullable=True)
     status = Column(String, default="pending")
+    subject_variant = Column(String, nullable=True)
+    body_variant = Column(String, nullable=True)
 
 
 class Suppression(Base):
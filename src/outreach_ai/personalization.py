@@ -1,8 +1,25 @@
 """Personalization utilities for Outreach AI emails."""
+from functools import lru_cache
 from typing import Dict
 from jinja2 import Template
 
 
+@lru_cache(maxsize=128)
+def compile_template(template_str: str) -> Template:
+    """Compile a Jinja2 template string, reusing earlier compilations.
+
+    Campaigns render the same template once per recipient, so caching the
+    compiled template avoids re-parsing it for every message.
+
+    Args:
+        template_str: The raw template string.
+
+    Returns:
+        The compiled ``jinja2.Template``.
+    """
+    return Template(template_str)
+
+
 def render_template(template_str: str, context: Dict[str, str]) -> str:
     """Render a Jinja2 template string with the provided context.
 
@@ -13,5 +30,5 @@ def render_template(template_str: str, context: Dict[str, str]) -> str:
     Returns:
         A rendered string with the placeholders replaced by context values.
     """
-    template = Template(template_str)
+    template = compile_template(template_str)
     return template.render(**context)
@@ -0,0 +1,404 @@
+"""Campaign-level spam pre-flight checks.
+
+Most of every outgoing email is static template text; only the substituted
+fields differ between recipients. Rather than running
+:func:`~outreach_ai.analyzer.spam_score` over each fully rendered message,
+this module analyzes a template's static parts once, caches the result by
+the template's SHA-256, and per recipient only analyzes the substituted
+field values together with the static characters they touch (themselves
+memoized, since names and companies repeat). The features are combined
+incrementally and scored exactly as ``spam_score`` would.
+
+A field value and the static text around it up to the nearest whitespace
+form one word in the rendered message (``Hello {{ name }},`` renders
+``JOE,``), so those edge tokens are left out of the static features and
+re-extracted with each value. A trigger phrase spanning two substituted
+values, text repeated by ``{% for %}`` loops, and filters applied to fields
+are not modeled. Text and fields inside conditional blocks are always
+counted, which errs towards a higher score; names used only in conditions,
+loop iterables or filter arguments are not output and so are not counted.
+
+:func:`run_preflight` streams recipients through this pipeline and returns a
+:class:`PreflightReport` that can gate a campaign before launch.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Tuple, Union
+
+from jinja2 import Environment, meta, nodes
+
+from .analyzer import (
+    TRIGGER_WORDS,
+    SpamFeatures,
+    combine_features,
+    extract_features,
+    score_features,
+)
+
+_ENV = Environment()
+
+# Static characters on either side of a field run that a trigger phrase
+# starting or ending inside the run could reach into.
+_TRIGGER_REACH = max(len(word) for word in TRIGGER_WORDS) - 1
+
+_EDGES = re.compile(r"\A(\S*)(.*?)(\S*)\Z", re.S)
+
+# A substitution slot: the names whose values an ``{{ ... }}`` outputs.
+_Slot = Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class FieldRun:
+    """Substituted fields joined by static text into the same rendered word(s).
+
+    Attributes:
+        pieces: Static text around and between the slots, one more than
+            ``slots``. Only the first and last piece may be empty; none
+            contains whitespace.
+        slots: Names output by each ``{{ ... }}`` in the run.
+        before: Static text preceding the run, kept for trigger matching.
+        after: Static text following the run, kept for trigger matching.
+    """
+
+    pieces: Tuple[str, ...]
+    slots: Tuple[_Slot, ...]
+    before: str = ""
+    after: str = ""
+
+    def render(self, context: Mapping[str, Any]) -> str:
+        """Return the run's text with ``context`` substituted."""
+        parts = [self.pieces[0]]
+        for slot, piece in zip(self.slots, self.pieces[1:]):
+            parts.append(" ".join(str(context[n]) for n in slot if context.get(n) is not None))
+            parts.append(piece)
+        return "".join(parts)
+
+
+@dataclass(frozen=True)
+class TemplateProfile:
+    """Spam features of a template's static text and the fields it substitutes.
+
+    Attributes:
+        digest: SHA-256 of the template source.
+        static: Features of the literal text that never touches a field.
+        fields: ``(name, occurrences)`` for each substituted variable.
+        runs: Where fields are substituted, with their adjacent static text.
+    """
+
+    digest: str
+    static: SpamFeatures
+    fields: Tuple[Tuple[str, int], ...]
+    runs: Tuple[FieldRun, ...] = ()
+
+
+_PROFILES: Dict[str, TemplateProfile] = {}
+
+
+def _output_names(expr: nodes.Expr) -> Iterable[str]:
+    """Yield variable names loaded by an ``{{ ... }}`` output expression."""
+    names = [expr] if isinstance(expr, nodes.Name) else []
+    names.extend(expr.find_all(nodes.Name))
+    for name in names:
+        if name.ctx == "load":
+            yield name.name
+
+
+def _flatten(node: nodes.Node, declared: Iterable[str]) -> Iterator[Union[str, _Slot]]:
+    """Yield a template's output in document order as text and slots.
+
+    Only ``{{ ... }}`` output reaches the rendered text; names used in
+    ``{% if %}`` tests or ``{% for %}`` iterables do not.
+    """
+    if isinstance(node, nodes.Output):
+        for child in node.nodes:
+            if isinstance(child, nodes.TemplateData):
+                yield child.data
+                continue
+            slot = tuple(name for name in _output_names(child) if name in declared)
+            # Output that doesn't come from the context (loop variables,
+            # literals) is unknown; treat it as a word break.
+            yield slot if slot else " "
+        return
+    for child in node.iter_child_nodes():
+        if isinstance(child, nodes.Stmt):
+            yield from _flatten(child, declared)
+
+
+def _profile(digest: str, template_str: str) -> TemplateProfile:
+    ast = _ENV.parse(template_str)
+    declared = meta.find_undeclared_variables(ast)
+
+    # Alternate static text and slots: texts[i] precedes slots[i].
+    texts: List[str] = [""]
+    slots: List[_Slot] = []
+    for item in _flatten(ast, declared):
+        if isinstance(item, str):
+            texts[-1] += item
+        else:
+            slots.append(item)
+            texts.append("")
+
+    static: List[str] = []
+    runs: List[FieldRun] = []
+    pieces: List[str] = []
+    run_slots: List[_Slot] = []
+    before = ""
+    for index, text in enumerate(texts):
+        first, last = index == 0, index == len(slots)
+        if first and last:
+            head, core, tail = "", text, ""
+        elif any(c.isspace() for c in text):
+            head, core, tail = _EDGES.match(text).groups()
+            if first:
+                core, head = head + core, ""
+            if last:
+                core, tail = core + tail, ""
+        elif first:
+            head, core, tail = "", "", text
+        elif last:
+            head, core, tail = text, "", ""
+        else:
+            pieces.append(text)
+            run_slots.append(slots[index])
+            continue
+        if not first:
+            pieces.append(head)
+            runs.append(
+                FieldRun(tuple(pieces), tuple(run_slots), before, core[:_TRIGGER_REACH])
+            )
+        static.append(core)
+        if not last:
+            before = core[-_TRIGGER_REACH:] if core else ""
+            pieces = [tail]
+            run_slots = [slots[index]]
+
+    counts = Counter(name for slot in slots for name in slot)
+    return TemplateProfile(
+        digest,
+        combine_features(extract_features(text) for text in static),
+        tuple(sorted(counts.items())),
+        tuple(runs),
+    )
+
+
+def template_profile(template_str: str) -> TemplateProfile:
+    """Return the profile for ``template_str``, computing it at most once.
+
+    Args:
+        template_str: Jinja2 template source.
+
+    Returns:
+        The cached :class:`TemplateProfile` for the template's hash.
+    """
+    digest = hashlib.sha256(template_str.encode("utf-8")).hexdigest()
+    profile = _PROFILES.get(digest)
+    if profile is None:
+        profile = _PROFILES[digest] = _profile(digest, template_str)
+    return profile
+
+
+@lru_cache(maxsize=8192)
+def _text_features(text: str) -> SpamFeatures:
+    return extract_features(text)
+
+
+def _substituted(profile: TemplateProfile, context: Mapping[str, Any]) -> List[SpamFeatures]:
+    """Return features for each field run with ``context`` substituted."""
+    found: List[SpamFeatures] = []
+    for run in profile.runs:
+        text = run.render(context)
+        features = _text_features(text)
+        if run.before or run.after:
+            features = features._replace(
+                triggers=_text_features(run.before + text + run.after).triggers
+            )
+        found.append(features)
+    return found
+
+
+def message_features(
+    subject_template: str, body_template: str, context: Mapping[str, Any]
+) -> SpamFeatures:
+    """Return combined spam features for one recipient's message.
+
+    Equivalent to extracting features from the rendered body and adding the
+    rendered subject's exclamation marks, as ``spam_score`` does, subject to
+    the approximations described in the module docstring.
+    """
+    return _profile_features(
+        template_profile(subject_template), template_profile(body_template), context
+    )
+
+
+def _profile_features(
+    subject: TemplateProfile, body: TemplateProfile, context: Mapping[str, Any]
+) -> SpamFeatures:
+    """Combine already-resolved template profiles with one recipient's values."""
+    features = combine_features([body.static, *_substituted(body, context)])
+    subject_exclamations = subject.static.exclamations + sum(
+        item.exclamations for item in _substituted(subject, context)
+    )
+    return features._replace(exclamations=features.exclamations + subject_exclamations)
+
+
+@dataclass
+class PreflightReport:
+    """Campaign-wide spam score distribution and launch gate.
+
+    Attributes:
+        threshold: Scores above this flag a recipient's message.
+        max_flagged_ratio: Largest share of flagged messages that still
+            passes the gate.
+        template_score: Score of the templates' static text alone.
+        template_explanation: Explanation for ``template_score``.
+        histogram: Number of messages per score.
+        trigger_frequency: Number of messages containing each trigger word.
+        worst: ``(score, recipient, explanation)`` for the highest-scoring
+            messages, worst first.
+        missing_fields: Number of messages in which each field output by
+            the templates had no value and so was not scored.
+    """
+
+    threshold: int
+    max_flagged_ratio: float
+    template_score: int = 0
+    template_explanation: str = ""
+    histogram: Counter = field(default_factory=Counter)
+    trigger_frequency: Counter = field(default_factory=Counter)
+    worst: List[Tuple[int, str, str]] = field(default_factory=list)
+    missing_fields: Counter = field(default_factory=Counter)
+
+    @property
+    def total(self) -> int:
+        return sum(self.histogram.values())
+
+    @property
+    def flagged(self) -> int:
+        """Number of messages scoring above ``threshold``."""
+        return sum(n for score, n in self.histogram.items() if score > self.threshold)
+
+    @property
+    def mean(self) -> float:
+        if not self.total:
+            return 0.0
+        return sum(score * n for score, n in self.histogram.items()) / self.total
+
+    @property
+    def max_score(self) -> int:
+        return max(self.histogram, default=0)
+
+    def percentile(self, pct: float) -> int:
+        """Return the nearest-rank ``pct`` percentile score (0-100)."""
+        if not 0 <= pct <= 100:
+            raise ValueError("pct must be between 0 and 100")
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(pct / 100 * self.total))
+        seen = 0
+        for score in sorted(self.histogram):
+            seen += self.histogram[score]
+            if seen >= rank:
+                return score
+        return self.max_score
+
+    @property
+    def passed(self) -> bool:
+        """Whether the campaign is clear to send."""
+        if not self.total:
+            return True
+        return self.flagged / self.total <= self.max_flagged_ratio
+
+    def summary(self) -> str:
+        """Return a human-readable multi-line report."""
+        lines = [
+            f"Pre-flight: {'PASS' if self.passed else 'FAIL'}",
+            f"Messages: {self.total}, flagged (> {self.threshold}): {self.flagged}",
+            f"Template score: {self.template_score} ({self.template_explanation})",
+            f"Score mean {self.mean:.2f}, median {self.percentile(50)}, "
+            f"p90 {self.percentile(90)}, max {self.max_score}",
+            "Distribution: "
+            + ", ".join(f"{score}: {n}" for score, n in sorted(self.histogram.items())),
+        ]
+        if self.trigger_frequency:
+            lines.append(
+                "Trigger words: "
+                + ", ".join(f"{w} ({n})" for w, n in self.trigger_frequency.most_common())
+            )
+        if self.missing_fields:
+            lines.append(
+                "Fields without a value (not scored): "
+                + ", ".join(f"{name} ({n})" for name, n in sorted(self.missing_fields.items()))
+            )
+        for score, recipient, explanation in self.worst:
+            lines.append(f"  {score:>3}  {recipient}  {explanation}")
+        return "\n".join(lines)
+
+
+def run_preflight(
+    subject_template: str,
+    body_template: str,
+    contexts: Iterable[Mapping[str, Any]],
+    *,
+    threshold: int = 5,
+    max_flagged_ratio: float = 0.0,
+    worst: int = 10,
+) -> PreflightReport:
+    """Score every recipient's message and build a campaign report.
+
+    ``contexts`` is consumed lazily, so it can be a generator over database
+    rows. Messages are never rendered.
+
+    Args:
+        subject_template: Jinja2 subject line template.
+        body_template: Jinja2 body template.
+        contexts: One render context per recipient; ``email`` identifies
+            the recipient in the report when present.
+        threshold: Scores above this flag the message.
+        max_flagged_ratio: Largest share of flagged messages that passes.
+        worst: How many of the highest-scoring messages to keep.
+
+    Returns:
+        The populated :class:`PreflightReport`.
+    """
+    subject = template_profile(subject_template)
+    body = template_profile(body_template)
+    static = _profile_features(subject, body, {})
+    template_score, template_explanation = score_features(static)
+    report = PreflightReport(
+        threshold=threshold,
+        max_flagged_ratio=max_flagged_ratio,
+        template_score=template_score,
+        template_explanation=template_explanation,
+    )
+
+    field_names = sorted({name for name, _ in subject.fields + body.fields})
+
+    heap: List[Tuple[int, int, str, str]] = []
+    for index, context in enumerate(contexts):
+        for name in field_names:
+            if context.get(name) is None:
+                report.missing_fields[name] += 1
+        features = _profile_features(subject, body, context)
+        score, explanation = score_features(features)
+        report.histogram[score] += 1
+        report.trigger_frequency.update(features.triggers)
+
+        entry = (score, -index, str(context.get("email") or f"#{index}"), explanation)
+        if len(heap) < worst:
+            heapq.heappush(heap, entry)
+        elif worst and entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    report.worst = [
+        (score, recipient, explanation)
+        for score, _, recipient, explanation in sorted(heap, reverse=True)
+    ]
+    return report
@@ -1,7 +1,9 @@
 """Email sending utilities for outreach.
 
 This module provides asynchronous helpers to send emails via SMTP using
-``aiosmtplib``. It also supports a simulation mode controlled by the
+``aiosmtplib``, either one message per connection with :func:`send_email`
+or several messages over a single connection with :func:`send_batch`. It
+also supports a simulation mode controlled by the
 ``SIMULATION_MODE`` environment variable; when enabled, emails are not
 actually sent but are instead logged for testing purposes.
 """
@@ -11,7 +13,7 @@ from __future__ import annotations
 import logging
 import os
 from email.message import EmailMessage
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import aiosmtplib  # type: ignore
 
@@ -19,6 +21,36 @@ import aiosmtplib  # type: ignore
 SIMULATION_MODE: bool = os.getenv("SIMULATION_MODE", "1") == "1"
 
 
+def build_message(
+    *,
+    sender_email: str,
+    recipient: str,
+    subject: str,
+    html_body: str,
+    text_body: Optional[str] = None,
+) -> EmailMessage:
+    """Build a multipart email with an HTML and optional plain-text body.
+
+    Args:
+        sender_email: The email address of the sender.
+        recipient: Value for the ``To`` header.
+        subject: Email subject line.
+        html_body: HTML portion of the email body.
+        text_body: Optional plain-text portion of the email body.
+
+    Returns:
+        The assembled ``EmailMessage``.
+    """
+    message = EmailMessage()
+    message["From"] = sender_email
+    message["To"] = recipient
+    message["Subject"] = subject
+    if text_body:
+        message.set_content(text_body)
+    message.add_alternative(html_body, subtype="html")
+    return message
+
+
 async def send_email(
     *,
     host: str,
@@ -49,14 +81,13 @@ async def send_email(
     Raises:
         aiosmtplib.SMTPException: If sending fails when not in simulation mode.
     """
-    # Build the email message
-    message = EmailMessage()
-    message["From"] = sender_email
-    message["To"] = recipient
-    message["Subject"] = subject
-    if text_body:
-        message.set_content(text_body)
-    message.add_alternative(html_body, subtype="html")
+    message = build_message(
+        sender_email=sender_email,
+        recipient=recipient,
+        subject=subject,
+        html_body=html_body,
+        text_body=text_body,
+    )
 
     if SIMULATION_MODE:
         logging.info(
@@ -72,3 +103,88 @@ async def send_email(
         password=password,
         start_tls=start_tls,
     )
+
+
+def _failure(exc: BaseException) -> Tuple[int, str]:
+    """Return the ``(code, message)`` reply carried by an SMTP exception."""
+    code = getattr(exc, "code", None)
+    return (code if isinstance(code, int) else 0, str(getattr(exc, "message", exc)))
+
+
+async def send_batch(
+    *,
+    host: str,
+    port: int,
+    username: str,
+    password: str,
+    messages: Sequence[Tuple[EmailMessage, Sequence[str]]],
+    start_tls: bool = True,
+) -> List[Dict[str, Tuple[int, str]]]:
+    """Send several messages over one SMTP connection.
+
+    Each entry in ``messages`` is an ``(EmailMessage, recipients)`` pair; all
+    recipients of an entry are delivered in a single SMTP transaction. Errors
+    are reported per recipient rather than raised, so one refused address does
+    not abort the rest of the batch.
+
+    Args:
+        host: SMTP server hostname.
+        port: SMTP server port.
+        username: SMTP username for authentication.
+        password: SMTP password for authentication.
+        messages: Messages and their envelope recipients.
+        start_tls: Whether to use STARTTLS for encryption.
+
+    Returns:
+        One mapping per entry in ``messages`` from recipient address to the
+        server's ``(code, message)`` reply. Failures without a reply code,
+        such as dropped connections, are reported with code ``0``.
+    """
+    results: List[Dict[str, Tuple[int, str]]] = []
+
+    if SIMULATION_MODE:
+        for message, recipients in messages:
+            logging.info(
+                "Simulating send to %s with subject %s",
+                ", ".join(recipients),
+                message["Subject"],
+            )
+            results.append({rcpt: (250, "simulated") for rcpt in recipients})
+        return results
+
+    client = aiosmtplib.SMTP(hostname=host, port=port, start_tls=start_tls)
+    try:
+        try:
+            await client.connect()
+            if username:
+                await client.login(username, password)
+        except aiosmtplib.SMTPException as exc:
+            failure = _failure(exc)
+            return [{rcpt: failure for rcpt in recipients} for _, recipients in messages]
+
+        for index, (message, recipients) in enumerate(messages):
+            outcome = {rcpt: (250, "OK") for rcpt in recipients}
+            try:
+                errors, _ = await client.send_message(message, recipients=list(recipients))
+                for rcpt, response in errors.items():
+                    outcome[rcpt] = (response.code, response.message)
+            except aiosmtplib.SMTPRecipientsRefused as exc:
+                for refused in exc.recipients:
+                    outcome[refused.recipient] = (refused.code, refused.message)
+            except aiosmtplib.SMTPServerDisconnected as exc:
+                # The connection is gone; report this and every later entry.
+                failure = _failure(exc)
+                for _, pending in messages[index:]:
+                    results.append({rcpt: failure for rcpt in pending})
+                return results
+            except aiosmtplib.SMTPException as exc:
+                failure = _failure(exc)
+                outcome = {rcpt: failure for rcpt in recipients}
+            results.append(outcome)
+    finally:
+        if client.is_connected:
+            try:
+                await client.quit()
+            except aiosmtplib.SMTPException:
+                client.close()
+    return results
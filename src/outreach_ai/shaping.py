@@ -0,0 +1,355 @@
+"""Per-destination-domain shaping for outbound mail.
+
+Large mailbox providers throttle on concurrent connections and messages per
+minute from the same source. The :class:`OutboundShaper` groups queued
+messages by destination (recipient domain, folded onto its mail provider
+where known), enforces a :class:`DomainPolicy` per destination, interleaves
+destinations so one large domain cannot starve the rest, and packs messages
+for the same destination into as few SMTP connections and transactions as
+the policy allows.
+
+When a :class:`~outreach_ai.feedback.FeedbackLoop` is supplied, its adaptive
+per-domain rate caps the policy rate and every delivery outcome is fed back
+into it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import (
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .feedback import (
+    PROVIDER_ALIASES,
+    FeedbackLoop,
+    classify_smtp_response,
+    destination_key,
+    recipient_domain,
+)
+
+
+@dataclass
+class DomainPolicy:
+    """Sending limits for one destination.
+
+    Attributes:
+        max_concurrency: Simultaneous SMTP connections to the destination.
+        rate_per_minute: Messages per minute across all those connections.
+        max_recipients_per_transaction: Recipients that may share one
+            transaction when their content is identical. ``1`` disables
+            recipient batching.
+        max_messages_per_connection: Transactions sent before reconnecting.
+    """
+
+    max_concurrency: int = 2
+    rate_per_minute: float = 60.0
+    max_recipients_per_transaction: int = 1
+    max_messages_per_connection: int = 20
+
+
+DEFAULT_POLICIES: Dict[str, DomainPolicy] = {
+    "gmail.com": DomainPolicy(max_concurrency=3, rate_per_minute=120.0),
+    "outlook.com": DomainPolicy(max_concurrency=2, rate_per_minute=60.0),
+    "yahoo.com": DomainPolicy(max_concurrency=2, rate_per_minute=60.0),
+}
+
+
+@dataclass
+class OutboundMessage:
+    """A rendered message queued for one recipient."""
+
+    sender_email: str
+    recipient: str
+    subject: str
+    html_body: str
+    text_body: Optional[str] = None
+    message_id: Optional[int] = None
+
+    def content_key(self) -> Tuple[str, str, str, Optional[str]]:
+        """Return the key under which identical messages may be batched."""
+        return (self.sender_email.lower(), self.subject, self.html_body, self.text_body)
+
+
+@dataclass
+class Transaction:
+    """One SMTP transaction: a single body delivered to one or more recipients."""
+
+    messages: List[OutboundMessage]
+
+    @property
+    def recipients(self) -> List[str]:
+        return [message.recipient for message in self.messages]
+
+
+@dataclass
+class Batch:
+    """Transactions from one sender to one destination over one connection."""
+
+    destination: str
+    sender_email: str
+    transactions: List[Transaction] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        """Number of recipients in the batch."""
+        return sum(len(transaction.messages) for transaction in self.transactions)
+
+
+# A deliverer sends one batch over one connection and returns, for each
+# transaction in order, the server's ``(code, message)`` reply per recipient.
+Deliverer = Callable[[Batch], Awaitable[Sequence[Mapping[str, Tuple[int, str]]]]]
+
+
+class OutboundShaper:
+    """Schedule outbound messages under per-destination limits.
+
+    Args:
+        policies: Policies keyed by destination. Missing destinations use
+            ``default_policy``.
+        default_policy: Policy for destinations without an explicit entry.
+        resolve: Optional callable mapping a recipient domain to a
+            destination key, e.g. via an MX lookup. Defaults to folding
+            :data:`PROVIDER_ALIASES`.
+        feedback: Optional feedback loop providing adaptive rates and
+            suppression, and receiving delivery outcomes.
+        max_connections: Global cap on simultaneous SMTP connections.
+        clock: Monotonic clock, injectable for tests.
+        sleep: Coroutine used to wait between batches.
+    """
+
+    def __init__(
+        self,
+        *,
+        policies: Optional[Mapping[str, DomainPolicy]] = None,
+        default_policy: Optional[DomainPolicy] = None,
+        resolve: Optional[Callable[[str], str]] = None,
+        feedback: Optional[FeedbackLoop] = None,
+        max_connections: int = 10,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        if max_connections < 1:
+            raise ValueError("max_connections must be at least 1")
+        self.policies: Dict[str, DomainPolicy] = dict(
+            DEFAULT_POLICIES if policies is None else policies
+        )
+        self.default_policy = default_policy or DomainPolicy()
+        self.resolve = resolve
+        self.feedback = feedback
+        self.max_connections = max_connections
+        self.clock = clock
+        self.sleep = sleep
+        self._next_allowed: Dict[str, float] = {}
+
+    def destination(self, recipient: str) -> str:
+        """Return the destination key that ``recipient`` is shaped under."""
+        if self.resolve is not None:
+            return self.resolve(recipient_domain(recipient)).lower()
+        return destination_key(recipient)
+
+    def policy_for(self, destination: str) -> DomainPolicy:
+        """Return the policy that applies to ``destination``."""
+        return self.policies.get(destination, self.default_policy)
+
+    def rate_for(self, destination: str) -> float:
+        """Return the effective messages-per-minute for ``destination``.
+
+        This is the policy rate, lowered to the feedback loop's adaptive rate
+        when the destination has been throttling.
+        """
+        rate = self.policy_for(destination).rate_per_minute
+        if self.feedback is not None:
+            rate = min(rate, self.feedback.rate_for(destination, initial=rate).rate)
+        return rate
+
+    def plan(self, messages: Iterable[OutboundMessage]) -> List[Batch]:
+        """Group messages into batches and interleave them across destinations.
+
+        Messages with identical content to the same destination share a
+        transaction up to ``max_recipients_per_transaction``; transactions
+        from the same sender share a connection up to
+        ``max_messages_per_connection``. Batches are then emitted round-robin
+        by destination.
+
+        Batching takes priority over strict queue order: within a destination,
+        each sender's messages are sent together in the order that sender
+        first appears, and a message with the same content as an earlier one
+        is pulled forward to join it. For ``[X->a, Y->b, X->c]`` with
+        identical ``X`` content, ``a`` and ``c`` go out before ``b``.
+
+        Args:
+            messages: Queued messages in priority order.
+
+        Returns:
+            Batches in the order they should be dispatched.
+        """
+        # destination -> sender -> content key -> transactions
+        grouped: Dict[str, Dict[str, Dict[tuple, List[Transaction]]]] = {}
+        for message in messages:
+            if self.feedback is not None and self.feedback.is_suppressed(message.recipient):
+                continue
+            destination = self.destination(message.recipient)
+            limit = max(1, self.policy_for(destination).max_recipients_per_transaction)
+            by_sender = grouped.setdefault(destination, {})
+            by_content = by_sender.setdefault(message.sender_email.lower(), {})
+            transactions = by_content.setdefault(message.content_key(), [])
+            if (
+                transactions
+                and len(transactions[-1].messages) < limit
+                and message.recipient not in transactions[-1].recipients
+            ):
+                transactions[-1].messages.append(message)
+            else:
+                transactions.append(Transaction(messages=[message]))
+
+        queues: Dict[str, Deque[Batch]] = {}
+        for destination, by_sender in grouped.items():
+            policy = self.policy_for(destination)
+            per_connection = max(1, policy.max_messages_per_connection)
+            # A batch is sent as a burst, so keep it within one minute's budget
+            # at the current, possibly throttled, rate.
+            max_recipients = max(1, int(self.rate_for(destination)))
+            queue: Deque[Batch] = deque()
+            for sender, by_content in by_sender.items():
+                batch = Batch(destination=destination, sender_email=sender)
+                for transactions in by_content.values():
+                    for transaction in transactions:
+                        if batch.transactions and (
+                            len(batch.transactions) >= per_connection
+                            or batch.size + len(transaction.messages) > max_recipients
+                        ):
+                            queue.append(batch)
+                            batch = Batch(destination=destination, sender_email=sender)
+                        batch.transactions.append(transaction)
+                if batch.transactions:
+                    queue.append(batch)
+            queues[destination] = queue
+
+        ordered: List[Batch] = []
+        while queues:
+            for destination in list(queues):
+                queue = queues[destination]
+                ordered.append(queue.popleft())
+                if not queue:
+                    del queues[destination]
+        return ordered
+
+    def _reserve(self, batch: Batch) -> float:
+        """Reserve send time for ``batch`` and return how long to wait for it."""
+        now = self.clock()
+        start = max(now, self._next_allowed.get(batch.destination, 0.0))
+        interval = 60.0 / self.rate_for(batch.destination)
+        self._next_allowed[batch.destination] = start + interval * batch.size
+        return start - now
+
+    async def run(
+        self, messages: Iterable[OutboundMessage], deliver: Deliverer
+    ) -> Dict[Union[int, str], str]:
+        """Deliver queued messages under the configured limits.
+
+        Args:
+            messages: Queued messages in priority order.
+            deliver: Coroutine that sends one batch over one connection, such
+                as the one returned by :func:`smtp_deliverer`.
+
+        Returns:
+            A mapping from each message's ``message_id`` (or its recipient
+            address when ``message_id`` is unset) to its classified outcome
+            (see :mod:`outreach_ai.feedback`).
+        """
+        batches = self.plan(messages)
+        connections = asyncio.Semaphore(self.max_connections)
+        per_destination: Dict[str, asyncio.Semaphore] = {}
+        outcomes: Dict[Union[int, str], str] = {}
+
+        async def dispatch(batch: Batch) -> None:
+            limit = per_destination.setdefault(
+                batch.destination,
+                asyncio.Semaphore(max(1, self.policy_for(batch.destination).max_concurrency)),
+            )
+            failure: Tuple[int, str] = (0, "no reply")
+            # Wait on the destination first so a busy domain never holds
+            # global connection slots that other domains could use.
+            async with limit:
+                delay = self._reserve(batch)
+                if delay > 0:
+                    await self.sleep(delay)
+                async with connections:
+                    try:
+                        replies = list(await deliver(batch))
+                    except Exception as exc:  # noqa: BLE001 - reported per recipient
+                        replies = []
+                        failure = (getattr(exc, "code", 0) or 0, str(exc))
+            for index, transaction in enumerate(batch.transactions):
+                transaction_replies = replies[index] if index < len(replies) else {}
+                for message in transaction.messages:
+                    code, text = transaction_replies.get(message.recipient) or failure
+                    outcome = classify_smtp_response(code, text)
+                    key = message.recipient if message.message_id is None else message.message_id
+                    outcomes[key] = outcome
+                    if self.feedback is not None:
+                        self.feedback.record(
+                            message.sender_email,
+                            message.recipient,
+                            outcome,
+                            text,
+                            domain=batch.destination,
+                        )
+
+        await asyncio.gather(*(dispatch(batch) for batch in batches))
+        return outcomes
+
+
+def smtp_deliverer(accounts: Mapping[str, object], start_tls: bool = True) -> Deliverer:
+    """Build a deliverer that sends batches with :func:`senders.send_batch`.
+
+    Args:
+        accounts: Sender accounts keyed by lower-cased email address. Each
+            value needs ``host``, ``port``, ``username`` and ``password``
+            attributes, as on :class:`~outreach_ai.models.Sender`.
+        start_tls: Whether to use STARTTLS for encryption.
+
+    Returns:
+        A coroutine function suitable for :meth:`OutboundShaper.run`.
+    """
+    from .senders import build_message, send_batch
+
+    async def deliver(batch: Batch) -> List[Dict[str, Tuple[int, str]]]:
+        account = accounts[batch.sender_email]
+        envelopes = []
+        for transaction in batch.transactions:
+            first = transaction.messages[0]
+            recipients = transaction.recipients
+            message = build_message(
+                sender_email=first.sender_email,
+                recipient=recipients[0] if len(recipients) == 1 else "undisclosed-recipients:;",
+                subject=first.subject,
+                html_body=first.html_body,
+                text_body=first.text_body,
+            )
+            envelopes.append((message, recipients))
+
+        return await send_batch(
+            host=account.host,
+            port=account.port,
+            username=account.username,
+            password=account.password,
+            messages=envelopes,
+            start_tls=start_tls,
+        )
+
+    return deliver
@@ -0,0 +1,427 @@
+"""Segment-level AI personalization and A/B variant assignment.
+
+Generating copy with a model for every recipient is slow and expensive.
+Instead, recipients are grouped into segments by role, industry and company
+segment; a :class:`SnippetProvider` generates personalized snippets once per
+segment, and the snippets are cached on disk by a content-addressed key.
+Each recipient's email is then rendered from the template with their own
+fields plus their segment's snippets, so provider calls scale with the
+number of segments rather than the number of recipients.
+
+Subject and body A/B variants are assigned deterministically from a hash of
+the recipient, so re-running a campaign assigns the same variants.
+:func:`record_variants` stores the assigned labels on each
+:class:`~outreach_ai.models.Message`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .personalization import render_template
+
+# Directory for cached snippets; override with the VARIANT_CACHE_DIR variable.
+CACHE_DIR: str = os.getenv("VARIANT_CACHE_DIR", "./.outreach_cache/snippets")
+
+# Recipient attributes exposed to templates.
+RECIPIENT_FIELDS = ("email", "name", "role", "company", "industry", "segment")
+
+SegmentKey = Tuple[str, str, str]
+
+
+def _field(recipient: Any, name: str) -> Optional[str]:
+    """Read a field from a mapping or a ``Recipient``-like object."""
+    if isinstance(recipient, Mapping):
+        return recipient.get(name)
+    return getattr(recipient, name, None)
+
+
+def segment_key(recipient: Any) -> SegmentKey:
+    """Return the normalized ``(role, industry, segment)`` key for a recipient."""
+    return tuple(  # type: ignore[return-value]
+        (_field(recipient, name) or "").strip().lower()
+        for name in ("role", "industry", "segment")
+    )
+
+
+class SnippetProvider(ABC):
+    """Interface for generating personalized snippets for a segment.
+
+    Subclasses set ``name`` and ``version`` (both part of the cache key, so
+    bumping ``version`` invalidates earlier output) and implement
+    :meth:`generate`.
+    """
+
+    name = "base"
+    version = "1"
+
+    @abstractmethod
+    def generate(self, segment: Mapping[str, str], brief: str = "") -> Dict[str, str]:
+        """Return snippets keyed by template variable name.
+
+        Args:
+            segment: The segment's ``role``, ``industry`` and ``segment``.
+            brief: Free-form campaign instructions for the provider.
+        """
+
+
+class LocalProvider(SnippetProvider):
+    """Deterministic stand-in provider that needs no network access.
+
+    Produces an ``opener``, ``value_prop`` and ``call_to_action`` from
+    phrase tables keyed by role and company segment. Useful for tests,
+    development and as a fallback when no model is configured.
+    """
+
+    name = "local"
+    version = "1"
+
+    ROLE_FOCUS = {
+        "ceo": "growth and long-term strategy",
+        "cto": "engineering velocity and reliability",
+        "founder": "getting to the next milestone faster",
+        "marketing": "pipeline and campaign performance",
+        "sales": "hitting quota with less manual work",
+        "engineering": "shipping without firefighting",
+    }
+    SEGMENT_ASK = {
+        "enterprise": "Would a short call with your team next week make sense?",
+        "mid-market": "Open to a 15-minute call this week?",
+        "smb": "Happy to send over a two-minute walkthrough if that's easier.",
+    }
+
+    def generate(self, segment: Mapping[str, str], brief: str = "") -> Dict[str, str]:
+        role = (segment.get("role") or "").lower()
+        industry = segment.get("industry") or "your industry"
+        focus = next(
+            (text for key, text in self.ROLE_FOCUS.items() if key in role),
+            "the goals your team is working toward",
+        )
+        return {
+            "opener": f"Teams in {industry} keep telling us the same thing about {focus}.",
+            "value_prop": f"We help teams like yours in {industry} make progress on {focus}.",
+            "call_to_action": self.SEGMENT_ASK.get(
+                segment.get("segment") or "", "Worth a quick conversation?"
+            ),
+        }
+
+
+class SnippetCache:
+    """Content-addressed on-disk cache of generated snippets.
+
+    Entries are JSON files named by the SHA-256 of the provider, its
+    version, the segment and the brief. Entries older than ``ttl`` seconds
+    are treated as missing, and once more than ``max_entries`` are stored
+    the least recently used ones are evicted. Recency is tracked through
+    file modification times, which are refreshed on every hit.
+
+    Args:
+        directory: Where to store entries. Created on first write.
+        ttl: Seconds an entry stays valid.
+        max_entries: Maximum number of entries kept on disk.
+        clock: Wall clock, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        directory: str = CACHE_DIR,
+        ttl: float = 7 * 24 * 3600,
+        max_entries: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+
+    @staticmethod
+    def key(provider: SnippetProvider, segment: Mapping[str, str], brief: str = "") -> str:
+        """Return the content address for a provider request."""
+        payload = json.dumps(
+            {
+                "provider": provider.name,
+                "version": provider.version,
+                "segment": dict(segment),
+                "brief": brief,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """Return the cached snippets for ``key``, or ``None`` on a miss.
+
+        Unreadable, malformed and expired entries are misses, as is an entry
+        removed by a concurrent :meth:`evict` while it is being read.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                entry = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict):
+            return None
+        created, snippets = entry.get("created"), entry.get("snippets")
+        if (
+            not isinstance(created, (int, float))
+            or isinstance(created, bool)
+            or not isinstance(snippets, dict)
+            or not all(isinstance(value, str) for value in snippets.values())
+        ):
+            return None
+
+        now = self.clock()
+        if now - created > self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            return None
+        return snippets
+
+    def put(self, key: str, snippets: Mapping[str, str]) -> None:
+        """Store snippets under ``key`` and evict old entries if needed."""
+        os.makedirs(self.directory, exist_ok=True)
+        now = self.clock()
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump({"created": now, "snippets": dict(snippets)}, handle)
+        os.replace(tmp_path, path)
+        os.utime(path, (now, now))
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove least recently used entries beyond ``max_entries``.
+
+        Returns:
+            The number of entries removed.
+        """
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except OSError:
+            return 0
+        excess = len(names) - self.max_entries
+        if excess <= 0:
+            return 0
+
+        def last_used(name: str) -> float:
+            try:
+                return os.path.getmtime(os.path.join(self.directory, name))
+            except OSError:
+                return 0.0
+
+        removed = 0
+        for name in sorted(names, key=last_used)[:excess]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def variant_label(index: int) -> str:
+    """Return the label for a variant index (``0 -> "A"``, ``1 -> "B"``...)."""
+    label = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        label = chr(ord("A") + remainder) + label
+    return label
+
+
+def assign_variant(key: str, count: int, weights: Optional[Sequence[float]] = None) -> int:
+    """Deterministically pick a variant index for ``key``.
+
+    Args:
+        key: Stable identifier, e.g. campaign id plus recipient email.
+        count: Number of variants.
+        weights: Optional relative weights, one per variant.
+
+    Returns:
+        An index in ``range(count)``.
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    weights = list(weights) if weights is not None else [1.0] * count
+    if len(weights) != count or any(w < 0 for w in weights) or sum(weights) <= 0:
+        raise ValueError("weights must be non-negative, one per variant, and not all zero")
+
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    point = int.from_bytes(digest[:8], "big") / 2 ** 64 * sum(weights)
+    cumulative = 0.0
+    for index, weight in enumerate(weights):
+        cumulative += weight
+        if point < cumulative:
+            return index
+    return count - 1
+
+
+@dataclass
+class RenderedEmail:
+    """A personalized email for one recipient and the variants it uses."""
+
+    recipient: Any
+    subject: str
+    html_body: str
+    subject_variant: str
+    body_variant: str
+
+
+class VariantEngine:
+    """Render personalized A/B variants with one provider call per segment.
+
+    Args:
+        provider: Snippet generator. Defaults to :class:`LocalProvider`.
+        cache: Optional on-disk cache shared across runs.
+        brief: Campaign instructions passed to the provider.
+    """
+
+    def __init__(
+        self,
+        provider: Optional[SnippetProvider] = None,
+        cache: Optional[SnippetCache] = None,
+        brief: str = "",
+    ) -> None:
+        self.provider = provider or LocalProvider()
+        self.cache = cache
+        self.brief = brief
+        self.provider_calls = 0
+        self._memo: Dict[SegmentKey, Dict[str, str]] = {}
+
+    def snippets_for(self, key: SegmentKey) -> Dict[str, str]:
+        """Return snippets for a segment, generating them only on a cache miss."""
+        if key in self._memo:
+            return self._memo[key]
+
+        segment = dict(zip(("role", "industry", "segment"), key))
+        address = SnippetCache.key(self.provider, segment, self.brief)
+        snippets = self.cache.get(address) if self.cache is not None else None
+        if snippets is None:
+            snippets = self.provider.generate(segment, self.brief)
+            self.provider_calls += 1
+            if self.cache is not None:
+                self.cache.put(address, snippets)
+        self._memo[key] = snippets
+        return snippets
+
+    def segments(self, recipients: Iterable[Any]) -> Dict[SegmentKey, List[Any]]:
+        """Group recipients by segment key, preserving input order."""
+        groups: Dict[SegmentKey, List[Any]] = {}
+        for recipient in recipients:
+            groups.setdefault(segment_key(recipient), []).append(recipient)
+        return groups
+
+    def render(
+        self,
+        recipients: Iterable[Any],
+        subjects: Sequence[str],
+        bodies: Sequence[str],
+        *,
+        context: Optional[Mapping[str, str]] = None,
+        salt: str = "",
+        subject_weights: Optional[Sequence[float]] = None,
+        body_weights: Optional[Sequence[float]] = None,
+    ) -> List[RenderedEmail]:
+        """Render every recipient's email with assigned A/B variants.
+
+        Templates see the shared ``context``, the segment's snippets and the
+        recipient's own fields, with later sources taking precedence.
+
+        Args:
+            recipients: ``Recipient`` rows or mappings with the same fields.
+            subjects: Subject line templates, one per subject variant.
+            bodies: Body templates, one per body variant.
+            context: Values shared by all recipients, e.g. sender details.
+            salt: Mixed into variant assignment; typically the campaign id.
+            subject_weights: Optional traffic split across ``subjects``.
+            body_weights: Optional traffic split across ``bodies``.
+
+        Returns:
+            Rendered emails grouped by segment, in input order within each.
+        """
+        rendered: List[RenderedEmail] = []
+        for key, members in self.segments(recipients).items():
+            snippets = self.snippets_for(key)
+            for recipient in members:
+                values: Dict[str, str] = dict(context or {})
+                values.update(snippets)
+                values.update(
+                    {name: _field(recipient, name) or "" for name in RECIPIENT_FIELDS}
+                )
+                identity = f"{salt}:{(values['email'] or '').lower()}"
+                subject_index = assign_variant(
+                    f"subject:{identity}", len(subjects), subject_weights
+                )
+                body_index = assign_variant(f"body:{identity}", len(bodies), body_weights)
+                rendered.append(
+                    RenderedEmail(
+                        recipient=recipient,
+                        subject=render_template(subjects[subject_index], values),
+                        html_body=render_template(bodies[body_index], values),
+                        subject_variant=variant_label(subject_index),
+                        body_variant=variant_label(body_index),
+                    )
+                )
+        return rendered
+
+
+def record_variants(session, campaign_id: int, emails: Iterable[RenderedEmail]) -> int:
+    """Store the assigned A/B labels on each recipient's campaign message.
+
+    The recipient's existing :class:`~outreach_ai.models.Message` for the
+    campaign is updated; if there is none, a pending message is queued.
+    Recipients given as mappings are matched by ``id`` or else by ``email``.
+    The caller is responsible for committing the session.
+
+    Args:
+        session: SQLAlchemy session.
+        campaign_id: Campaign the emails belong to.
+        emails: Output of :meth:`VariantEngine.render`.
+
+    Returns:
+        The number of messages updated or created.
+    """
+    from .models import Message, Recipient
+
+    written = 0
+    for rendered in emails:
+        recipient_id = _field(rendered.recipient, "id")
+        if recipient_id is None:
+            recipient_id = (
+                session.query(Recipient.id)
+                .filter(Recipient.email == _field(rendered.recipient, "email"))
+                .scalar()
+            )
+        if recipient_id is None:
+            continue
+
+        message = (
+            session.query(Message)
+            .filter(Message.campaign_id == campaign_id, Message.recipient_id == recipient_id)
+            .first()
+        )
+        if message is None:
+            message = Message(campaign_id=campaign_id, recipient_id=recipient_id)
+            session.add(message)
+        message.subject_variant = rendered.subject_variant
+        message.body_variant = rendered.body_variant
+        written += 1
+    return written
@@ -0,0 +1,75 @@
+"""Tests for the campaign pre-flight CLI command."""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from typer.testing import CliRunner
+
+from outreach_ai import cli
+from outreach_ai.models import Base, Campaign, Message, Recipient, Sender
+
+
+def _setup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("VARIANT_CACHE_DIR", raising=False)
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(cli, "SessionLocal", session_factory)
+
+    template = tmp_path / "body.html"
+    template.write_text(
+        "<p>Hi {{ name }}, {{ opener }}</p><p>{{ sender_name }} at {{ sender_company }}</p>"
+    )
+    with session_factory() as session:
+        session.add(Sender(id=1, name="FREE STUFF!", email="s@example.org"))
+        session.add(Campaign(id=1, name="c", subject="Hello", template_path=str(template)))
+        for i, status in enumerate(["pending", "pending", "sent"], start=1):
+            session.add(
+                Recipient(id=i, email=f"u{i}@example.com", name=f"U{i}", role="CTO", industry="saas")
+            )
+            session.add(Message(campaign_id=1, recipient_id=i, sender_id=1, status=status))
+        session.commit()
+
+
+def test_campaign_preflight_scores_pending_messages_with_full_context(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    result = CliRunner().invoke(cli.cli, ["campaign-preflight", "1", "--threshold", "2"])
+
+    # The sender name adds an exclamation, one uppercase word ("STUFF!";
+    # "<p>FREE" is not uppercase) and "free".
+    assert result.exit_code == 1, result.output
+    assert "Messages: 2, flagged (> 2): 2" in result.output
+    assert "u3@example.com" not in result.output
+    assert "sender_company (2)" in result.output
+    assert "opener" not in result.output
+    assert not (tmp_path / ".outreach_cache").exists()
+
+
+def test_campaign_preflight_passes_with_sender_company(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    result = CliRunner().invoke(
+        cli.cli, ["campaign-preflight", "1", "--threshold", "5", "--sender-company", "Acme"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "Pre-flight: PASS" in result.output
+    assert "Fields without a value" not in result.output
+
+
+def test_campaign_preflight_uses_configured_snippet_cache(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    cache_dir = tmp_path / "snippets"
+    monkeypatch.setenv("VARIANT_CACHE_DIR", str(cache_dir))
+    result = CliRunner().invoke(cli.cli, ["campaign-preflight", "1", "--threshold", "5"])
+
+    assert result.exit_code == 0, result.output
+    assert list(cache_dir.glob("*.json"))
+    assert not (tmp_path / ".outreach_cache").exists()
+
+
+def test_campaign_preflight_reports_missing_template(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    (tmp_path / "body.html").unlink()
+    result = CliRunner().invoke(cli.cli, ["campaign-preflight", "1"])
+
+    assert result.exit_code == 1
+    assert "body.html could not be read" in result.output
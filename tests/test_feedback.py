@@ -0,0 +1,171 @@
+"""Tests for the bounce and deferral feedback loop."""
+import asyncio
+
+from outreach_ai import feedback
+
+
+class StubSMTPError(Exception):
+    """Mimics an ``aiosmtplib`` response error."""
+
+    def __init__(self, code, message):
+        super().__init__(code, message)
+        self.code = code
+        self.message = message
+
+
+class StubSMTP:
+    """Local SMTP stand-in that defers the first ``deferrals`` sends per domain."""
+
+    def __init__(self, deferrals=0, hard=()):
+        self.deferrals = deferrals
+        self.hard = set(hard)
+        self.seen = {}
+        self.delivered = []
+
+    async def send(self, *, recipient, **kwargs):
+        if recipient in self.hard:
+            raise StubSMTPError(550, "5.1.1 <%s>: Recipient address rejected: User unknown" % recipient)
+        domain = feedback.recipient_domain(recipient)
+        self.seen[domain] = self.seen.get(domain, 0) + 1
+        if self.seen[domain] <= self.deferrals:
+            raise StubSMTPError(421, "4.7.0 Try again later, closing connection.")
+        self.delivered.append(recipient)
+
+
+async def _no_sleep(_seconds):
+    return None
+
+
+def _send(loop, stub, recipient):
+    return asyncio.run(
+        feedback.send_with_feedback(
+            loop,
+            send=stub.send,
+            sleep=_no_sleep,
+            sender_email="sales@example.org",
+            recipient=recipient,
+        )
+    )
+
+
+def test_classify_smtp_response():
+    assert feedback.classify_smtp_response(250, "2.0.0 OK") == feedback.DELIVERED
+    assert feedback.classify_smtp_response(550, "5.1.1 User unknown") == feedback.HARD
+    assert feedback.classify_smtp_response(452, "4.2.2 Mailbox full") == feedback.SOFT
+    assert feedback.classify_smtp_response(552, "5.2.2 Mailbox quota exceeded") == feedback.SOFT
+    assert feedback.classify_smtp_response(452, "Mailbox quota exceeded") == feedback.SOFT
+    assert feedback.classify_smtp_response(451, "Sending limit exceeded") == feedback.THROTTLE
+
+
+def test_classify_ignores_status_lookalikes_in_ip_addresses():
+    assert feedback.classify_smtp_response(554, "Client host [45.2.0.17] rejected") == feedback.SOFT
+    assert (
+        feedback.classify_smtp_response(550, "Mail from IP 10.2.3.4 refused, user unknown")
+        == feedback.HARD
+    )
+    assert (
+        feedback.classify_smtp_response(550, "mailbox unavailable (from 10.4.2.2)")
+        == feedback.HARD
+    )
+    # The status class must agree with the reply code.
+    assert feedback.classify_smtp_response(550, "4.2.2 Mailbox full") == feedback.HARD
+    assert feedback.classify_smtp_response(550, "550 5.1.1 User unknown") == feedback.HARD
+    assert feedback.classify_smtp_response(451, "2.0.0 OK") == feedback.SOFT
+    assert feedback.classify_smtp_response(421, "") == feedback.THROTTLE
+    assert feedback.classify_smtp_response(550, "5.7.1 Rate limit exceeded") == feedback.THROTTLE
+    assert feedback.classify_smtp_response(554, "5.7.1 Message rejected as spam") == feedback.SOFT
+
+
+def test_deferrals_back_off_domain_rate():
+    loop = feedback.FeedbackLoop(initial_rate=60.0)
+    stub = StubSMTP(deferrals=3)
+    outcomes = [_send(loop, stub, "a%d@gmail.com" % i) for i in range(3)]
+    assert outcomes == [feedback.THROTTLE] * 3
+    assert loop.rate_for("gmail.com").rate == 7.5
+    assert loop.domain_score("gmail.com") < 1.0
+    assert loop.rate_for("outlook.com").rate == 60.0
+
+    assert _send(loop, stub, "b@gmail.com") == feedback.DELIVERED
+    assert loop.rate_for("gmail.com").rate == 8.5
+
+
+def test_hard_bounce_suppresses_recipient():
+    loop = feedback.FeedbackLoop()
+    stub = StubSMTP(hard={"gone@example.com"})
+    assert _send(loop, stub, "gone@example.com") == feedback.HARD
+    assert loop.is_suppressed("Gone@Example.com")
+    assert _send(loop, stub, "gone@example.com") == "suppressed"
+    assert stub.delivered == []
+
+
+def test_delay_for_spaces_sends_per_domain():
+    now = [100.0]
+    loop = feedback.FeedbackLoop(initial_rate=60.0, clock=lambda: now[0])
+    assert loop.delay_for("a@example.com") == 0.0
+    assert loop.delay_for("b@example.com") == 1.0
+    assert loop.delay_for("c@other.com") == 0.0
+    # googlemail.com and gmail.com share one destination.
+    assert loop.delay_for("d@gmail.com") == 0.0
+    assert loop.delay_for("e@googlemail.com") == 1.0
+
+
+def test_unhealthy_sender_does_not_hold_back_other_senders():
+    now = [100.0]
+    loop = feedback.FeedbackLoop(initial_rate=60.0, alpha=0.5, clock=lambda: now[0])
+    for _ in range(3):
+        loop.record("bad@example.org", "x@unrelated.net", feedback.HARD)
+    assert loop.sender_score("bad@example.org") == 0.125
+
+    assert loop.delay_for("a@example.com", "bad@example.org") == 0.0
+    # The healthy sender only waits for the domain's one-second AIMD slot.
+    assert loop.delay_for("b@example.com", "good@example.org") == 1.0
+    assert loop.delay_for("c@example.com", "good@example.org") == 2.0
+    # The unhealthy sender is held back to 1 / 0.125 = 8 seconds.
+    assert loop.delay_for("d@example.com", "bad@example.org") == 8.0
+
+
+def test_parse_dsn():
+    raw = (
+        "From: MAILER-DAEMON@example.net\n"
+        "Content-Type: multipart/report; report-type=delivery-status; boundary=\"B\"\n"
+        "\n"
+        "--B\n"
+        "Content-Type: text/plain\n"
+        "\n"
+        "Delivery failed.\n"
+        "--B\n"
+        "Content-Type: message/delivery-status\n"
+        "\n"
+        "Reporting-MTA: dns; mx.example.net\n"
+        "\n"
+        "Final-Recipient: rfc822; gone@example.net\n"
+        "Action: failed\n"
+        "Status: 5.1.1\n"
+        "Diagnostic-Code: smtp; 550 5.1.1 user unknown\n"
+        "\n"
+        "Final-Recipient: rfc822; busy@example.net\n"
+        "Action: delayed\n"
+        "Status: 4.4.5\n"
+        "--B--\n"
+    )
+    loop = feedback.FeedbackLoop()
+    results = loop.record_dsn("sales@example.org", raw)
+    assert [(r, o) for r, o, _ in results] == [
+        ("gone@example.net", feedback.HARD),
+        ("busy@example.net", feedback.THROTTLE),
+    ]
+    assert loop.is_suppressed("gone@example.net")
+    assert not loop.is_suppressed("busy@example.net")
+
+
+def test_recipient_and_sender_failures_leave_domain_rate_alone():
+    loop = feedback.FeedbackLoop(initial_rate=60.0)
+    full = feedback.classify_smtp_response(552, "5.2.2 Mailbox quota exceeded")
+    loop.record("sales@example.org", "full@example.com", full)
+    assert loop.rate_for("example.com").rate == 60.0
+
+    auth = StubSMTPError(535, "5.7.8 Authentication credentials invalid")
+    loop.record("sales@example.org", "a@example.com", feedback.classify_exception(auth))
+    loop.record("sales@example.org", "b@example.com", feedback.classify_exception(TimeoutError()))
+    assert loop.rate_for("example.com").rate == 60.0
+    assert not loop.is_suppressed("full@example.com")
@@ -0,0 +1,90 @@
+"""Tests for the campaign spam pre-flight report."""
+from pathlib import Path
+
+from outreach_ai.analyzer import score_features, spam_score
+from outreach_ai.personalization import render_template
+from outreach_ai.preflight import message_features, run_preflight, template_profile
+
+SUBJECT = "Quick question, {{ name }}!"
+BODY = (
+    "<p>Hello {{ name }},</p>\n"
+    "<p>I saw {{ company }} is growing. Our offer might help {{ company }}.</p>"
+)
+
+CONTEXTS = [
+    {"email": "a@example.com", "name": "Ana", "company": "Acme"},
+    {"email": "b@example.com", "name": "Bob", "company": "FREE MONEY LTD"},
+    {"email": "c@example.com", "name": "Cy!", "company": "Initech"},
+]
+
+
+def test_incremental_score_matches_full_render():
+    for context in CONTEXTS:
+        expected = spam_score(render_template(SUBJECT, context), render_template(BODY, context))
+        assert score_features(message_features(SUBJECT, BODY, context)) == expected
+
+
+def test_template_profile_is_cached_by_hash():
+    copy = "".join(list(BODY))
+    assert copy is not BODY
+    assert template_profile(BODY) is template_profile(copy)
+    assert dict(template_profile(BODY).fields) == {"name": 1, "company": 2}
+
+
+def test_report_gates_campaign():
+    report = run_preflight(SUBJECT, BODY, iter(CONTEXTS), threshold=3, worst=2)
+    assert report.total == 3
+    assert report.template_score == 2
+    assert report.flagged == 2
+    assert not report.passed
+    assert [recipient for _, recipient, _ in report.worst] == ["b@example.com", "c@example.com"]
+    assert report.trigger_frequency["offer"] == 3
+    assert report.trigger_frequency["money"] == 1
+    assert report.percentile(50) == 4
+    assert "FAIL" in report.summary()
+
+    lenient = run_preflight(SUBJECT, BODY, CONTEXTS, threshold=4, max_flagged_ratio=0.5)
+    assert lenient.passed
+
+
+def test_names_outside_output_are_not_counted():
+    body = "{% if company %}Hi {{ company }}{% endif %}{% for x in items %}{% endfor %}"
+    context = {"company": "WIN!!", "items": []}
+    assert dict(template_profile(body).fields) == {"company": 1}
+    expected = spam_score("", render_template(body, context))
+    assert score_features(message_features("", body, context)) == expected
+
+
+def _assert_matches_render(subject, body, context):
+    expected = spam_score(render_template(subject, context), render_template(body, context))
+    assert score_features(message_features(subject, body, context)) == expected
+
+
+def test_values_join_adjacent_static_text():
+    # "JOE," and "IBM</p>" are single words once rendered.
+    for value in ["JOE", "IBM", "Ana", "NOW!", "fr"]:
+        context = {"name": value}
+        _assert_matches_render("", "Hello {{ name }},", context)
+        _assert_matches_render("", "<p>{{ name }}</p>", context)
+        _assert_matches_render("", "x{{ name }}-{{ name }}ee offer", context)
+    assert score_features(message_features("", "Hello {{ name }},", {"name": "JOE"}))[0] == 1
+
+
+def test_trigger_phrase_reaching_into_static_text():
+    _assert_matches_render("", "<p>There is no {{ word }} here</p>", {"word": "obligation"})
+    _assert_matches_render("", "<p>{{ word }} now</p>", {"word": "act"})
+
+
+def test_shipped_intro_template_matches_full_render():
+    with open(Path(__file__).parents[1] / "templates" / "intro_email.html") as handle:
+        body = handle.read()
+    for name, company in [("JOE", "IBM"), ("Ana", "ACME"), ("Bo", "Initech!")]:
+        context = {
+            "name": name,
+            "sender_name": "SAM",
+            "sender_company": "FREE",
+            "role": "CTO",
+            "company": company,
+            "industry": "retail",
+        }
+        _assert_matches_render("Hi {{ name }}!", body, context)
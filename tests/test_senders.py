@@ -0,0 +1,190 @@
+"""Tests for batched SMTP sending."""
+import asyncio
+from types import SimpleNamespace
+
+import aiosmtplib
+from aiosmtplib.response import SMTPResponse
+
+from outreach_ai import senders
+from outreach_ai.shaping import Batch, OutboundMessage, Transaction, smtp_deliverer
+
+
+class StubClient:
+    """Stands in for ``aiosmtplib.SMTP``.
+
+    ``login_error`` is raised by ``login``; ``script`` holds one entry per
+    ``send_message`` call, either an exception to raise or a dict of refused
+    recipients to return.
+    """
+
+    instances = []
+    login_error = None
+    script = []
+
+    def __init__(self, **kwargs):
+        self.is_connected = False
+        self.closed = False
+        self.sent = []
+        self.script = list(type(self).script)
+        StubClient.instances.append(self)
+
+    async def connect(self):
+        self.is_connected = True
+
+    async def login(self, username, password):
+        if self.login_error is not None:
+            raise self.login_error
+
+    async def send_message(self, message, recipients):
+        self.sent.append((message, recipients))
+        step = self.script.pop(0) if self.script else {}
+        if isinstance(step, BaseException):
+            if isinstance(step, aiosmtplib.SMTPServerDisconnected):
+                self.is_connected = False
+            raise step
+        return step, "OK"
+
+    async def quit(self):
+        self.is_connected = False
+        self.closed = True
+
+    def close(self):
+        self.is_connected = False
+        self.closed = True
+
+
+def _use_stub(monkeypatch, login_error=None, script=()):
+    StubClient.instances = []
+    monkeypatch.setattr(StubClient, "login_error", login_error)
+    monkeypatch.setattr(StubClient, "script", list(script))
+    monkeypatch.setattr(senders, "SIMULATION_MODE", False)
+    monkeypatch.setattr(senders.aiosmtplib, "SMTP", StubClient)
+
+
+def _message(recipient="a@example.com"):
+    return senders.build_message(
+        sender_email="sales@example.org",
+        recipient=recipient,
+        subject="Hi",
+        html_body="<p>Hi</p>",
+    )
+
+
+def _send(messages):
+    return asyncio.run(
+        senders.send_batch(
+            host="localhost",
+            port=2525,
+            username="sales",
+            password="secret",
+            messages=messages,
+        )
+    )
+
+
+def test_send_batch_closes_connection_when_login_fails(monkeypatch):
+    _use_stub(
+        monkeypatch,
+        login_error=aiosmtplib.SMTPAuthenticationError(535, "5.7.8 Authentication failed"),
+    )
+
+    results = _send([(_message(), ["a@example.com", "b@example.com"])])
+
+    assert results == [
+        {
+            "a@example.com": (535, "5.7.8 Authentication failed"),
+            "b@example.com": (535, "5.7.8 Authentication failed"),
+        }
+    ]
+    (client,) = StubClient.instances
+    assert client.closed and not client.is_connected
+
+
+def test_send_batch_reports_replies_per_transaction(monkeypatch):
+    _use_stub(
+        monkeypatch,
+        script=[
+            {"b@example.com": SMTPResponse(550, "5.1.1 User unknown")},
+            aiosmtplib.SMTPRecipientsRefused(
+                [aiosmtplib.SMTPRecipientRefused(452, "4.2.2 Mailbox full", "c@example.com")]
+            ),
+            aiosmtplib.SMTPDataError(554, "5.6.0 Message rejected"),
+            {},
+        ],
+    )
+
+    results = _send(
+        [
+            (_message(), ["a@example.com", "b@example.com"]),
+            (_message("c@example.com"), ["c@example.com"]),
+            (_message("d@example.com"), ["d@example.com"]),
+            (_message("e@example.com"), ["e@example.com"]),
+        ]
+    )
+
+    assert results == [
+        {"a@example.com": (250, "OK"), "b@example.com": (550, "5.1.1 User unknown")},
+        {"c@example.com": (452, "4.2.2 Mailbox full")},
+        {"d@example.com": (554, "5.6.0 Message rejected")},
+        {"e@example.com": (250, "OK")},
+    ]
+    (client,) = StubClient.instances
+    assert len(client.sent) == 4
+    assert client.closed
+
+
+def test_send_batch_fills_remaining_entries_after_disconnect(monkeypatch):
+    _use_stub(
+        monkeypatch,
+        script=[{}, aiosmtplib.SMTPServerDisconnected("Connection lost")],
+    )
+
+    results = _send(
+        [
+            (_message(), ["a@example.com"]),
+            (_message("b@example.com"), ["b@example.com"]),
+            (_message("c@example.com"), ["c@example.com", "d@example.com"]),
+        ]
+    )
+
+    assert results == [
+        {"a@example.com": (250, "OK")},
+        {"b@example.com": (0, "Connection lost")},
+        {"c@example.com": (0, "Connection lost"), "d@example.com": (0, "Connection lost")},
+    ]
+    (client,) = StubClient.instances
+    assert len(client.sent) == 2
+
+
+def test_smtp_deliverer_builds_one_message_per_transaction(monkeypatch):
+    _use_stub(monkeypatch, script=[{}, {"c@example.com": SMTPResponse(550, "5.1.1 Unknown")}])
+    account = SimpleNamespace(host="localhost", port=2525, username="sales", password="secret")
+    deliver = smtp_deliverer({"sales@example.org": account})
+
+    def outbound(recipient):
+        return OutboundMessage(
+            sender_email="sales@example.org",
+            recipient=recipient,
+            subject="Hi",
+            html_body="<p>Hi</p>",
+        )
+
+    batch = Batch(
+        destination="example.com",
+        sender_email="sales@example.org",
+        transactions=[
+            Transaction(messages=[outbound("a@example.com")]),
+            Transaction(messages=[outbound("b@example.com"), outbound("c@example.com")]),
+        ],
+    )
+    replies = asyncio.run(deliver(batch))
+
+    assert replies == [
+        {"a@example.com": (250, "OK")},
+        {"b@example.com": (250, "OK"), "c@example.com": (550, "5.1.1 Unknown")},
+    ]
+    (client,) = StubClient.instances
+    (single, single_rcpts), (shared, shared_rcpts) = client.sent
+    assert single["To"] == "a@example.com" and single_rcpts == ["a@example.com"]
+    assert shared["To"] == "undisclosed-recipients:;"
+    assert shared_rcpts == ["b@example.com", "c@example.com"]
@@ -0,0 +1,140 @@
+"""Tests for per-destination outbound shaping."""
+import asyncio
+
+from outreach_ai import feedback
+from outreach_ai.shaping import DomainPolicy, OutboundMessage, OutboundShaper
+
+
+def _message(recipient, body="Hello", sender="sales@example.org"):
+    return OutboundMessage(
+        sender_email=sender, recipient=recipient, subject="Hi", html_body=body
+    )
+
+
+def test_plan_interleaves_destinations():
+    shaper = OutboundShaper(
+        policies={}, default_policy=DomainPolicy(max_messages_per_connection=2)
+    )
+    queue = [_message("u%d@gmail.com" % i, body=str(i)) for i in range(6)]
+    queue.append(_message("a@small.io"))
+    queue.append(_message("b@hotmail.com"))
+
+    batches = shaper.plan(queue)
+    assert [b.destination for b in batches] == [
+        "gmail.com", "small.io", "outlook.com", "gmail.com", "gmail.com",
+    ]
+    assert [b.size for b in batches] == [2, 1, 1, 2, 2]
+
+
+def test_plan_batches_identical_content_per_transaction():
+    shaper = OutboundShaper(
+        policies={"example.com": DomainPolicy(max_recipients_per_transaction=3)}
+    )
+    queue = [_message("u%d@example.com" % i) for i in range(4)]
+    queue.append(_message("other@example.com", body="Different"))
+
+    (batch,) = shaper.plan(queue)
+    assert [t.recipients for t in batch.transactions] == [
+        ["u0@example.com", "u1@example.com", "u2@example.com"],
+        ["u3@example.com"],
+        ["other@example.com"],
+    ]
+
+
+def test_run_enforces_concurrency_and_feeds_back():
+    loop = feedback.FeedbackLoop()
+    shaper = OutboundShaper(
+        policies={"gmail.com": DomainPolicy(max_concurrency=1, max_messages_per_connection=1)},
+        feedback=loop,
+        sleep=lambda _s: asyncio.sleep(0),
+    )
+    active = {"gmail.com": 0}
+    peak = {"gmail.com": 0}
+
+    async def deliver(batch):
+        active[batch.destination] = active.get(batch.destination, 0) + 1
+        peak[batch.destination] = max(peak.get(batch.destination, 0), active[batch.destination])
+        await asyncio.sleep(0)
+        active[batch.destination] -= 1
+        replies = []
+        for transaction in batch.transactions:
+            reply = {}
+            for rcpt in transaction.recipients:
+                if rcpt.startswith("gone"):
+                    reply[rcpt] = (550, "5.1.1 User unknown")
+                elif rcpt.startswith("busy"):
+                    reply[rcpt] = (421, "4.7.0 Try again later")
+                else:
+                    reply[rcpt] = (250, "OK")
+            replies.append(reply)
+        return replies
+
+    queue = [_message("u%d@gmail.com" % i, body=str(i)) for i in range(3)]
+    queue += [_message("gone@example.com"), _message("busy@googlemail.com")]
+    outcomes = asyncio.run(shaper.run(queue, deliver))
+
+    assert peak["gmail.com"] == 1
+    assert outcomes["gone@example.com"] == feedback.HARD
+    assert outcomes["busy@googlemail.com"] == feedback.THROTTLE
+    assert loop.is_suppressed("gone@example.com")
+    assert shaper.rate_for("gmail.com") < 60.0
+    assert shaper.plan([_message("gone@example.com")]) == []
+
+
+def test_run_keys_outcomes_by_message_id():
+    shaper = OutboundShaper(policies={}, sleep=lambda _s: asyncio.sleep(0))
+    first = _message("a@example.com", body="one")
+    first.message_id = 1
+    second = _message("a@example.com", body="two")
+    second.message_id = 2
+
+    async def deliver(batch):
+        assert len(batch.transactions) == 2
+        return [
+            {"a@example.com": (250, "OK")},
+            {"a@example.com": (550, "5.1.1 User unknown")},
+        ]
+
+    loop = feedback.FeedbackLoop()
+    shaper.feedback = loop
+    outcomes = asyncio.run(shaper.run([first, second], deliver))
+    assert outcomes == {1: feedback.DELIVERED, 2: feedback.HARD}
+    assert loop.domain_health["example.com"].attempts == 2
+
+
+def test_plan_never_repeats_a_recipient_in_one_transaction():
+    shaper = OutboundShaper(
+        policies={}, default_policy=DomainPolicy(max_recipients_per_transaction=5)
+    )
+    (batch,) = shaper.plan([_message("a@example.com"), _message("a@example.com")])
+    assert [t.recipients for t in batch.transactions] == [["a@example.com"], ["a@example.com"]]
+
+
+def test_plan_caps_bursts_at_throttled_rate():
+    loop = feedback.FeedbackLoop()
+    shaper = OutboundShaper(policies={}, feedback=loop)
+    queue = [_message("u%d@example.com" % i, body=str(i)) for i in range(40)]
+    assert [b.size for b in shaper.plan(queue)] == [20, 20]
+
+    for _ in range(3):
+        loop.record("sales@example.org", "x@example.com", feedback.THROTTLE)
+    assert shaper.rate_for("example.com") == 7.5
+    assert {b.size for b in shaper.plan(queue)} == {7, 5}
+
+
+def test_plan_pulls_identical_content_forward():
+    shaper = OutboundShaper(
+        policies={}, default_policy=DomainPolicy(max_recipients_per_transaction=5)
+    )
+    queue = [
+        _message("a@example.com"),
+        _message("b@example.com", sender="other@example.org"),
+        _message("c@example.com"),
+    ]
+    recipients = [
+        rcpt
+        for batch in shaper.plan(queue)
+        for t in batch.transactions
+        for rcpt in t.recipients
+    ]
+    assert recipients == ["a@example.com", "c@example.com", "b@example.com"]
@@ -15,6 +15,10 @@ def test_imports():
         "outreach_ai.compliance",
         "outreach_ai.senders",
         "outreach_ai.dashboard",
+        "outreach_ai.preflight",
+        "outreach_ai.feedback",
+        "outreach_ai.shaping",
+        "outreach_ai.variants",
         "outreach_ai.cli",
     ]
     for mod in modules:
@@ -0,0 +1,163 @@
+"""Tests for segment-level personalization and A/B variants."""
+from datetime import datetime
+
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from outreach_ai.dashboard import variant_performance
+from outreach_ai.models import Base, Campaign, Message, Recipient
+from outreach_ai.variants import (
+    LocalProvider,
+    SnippetCache,
+    SnippetProvider,
+    VariantEngine,
+    assign_variant,
+    record_variants,
+    variant_label,
+)
+
+
+class CountingProvider(LocalProvider):
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, segment, brief=""):
+        self.calls += 1
+        return super().generate(segment, brief)
+
+
+def _recipients(count):
+    roles = ["CTO", "VP Marketing"]
+    return [
+        {
+            "email": "user%d@example.com" % i,
+            "name": "User %d" % i,
+            "role": roles[i % 2],
+            "company": "Company %d" % i,
+            "industry": "fintech",
+            "segment": "smb",
+        }
+        for i in range(count)
+    ]
+
+
+def test_provider_calls_scale_with_segments(tmp_path):
+    provider = CountingProvider()
+    engine = VariantEngine(provider, SnippetCache(str(tmp_path)))
+    emails = engine.render(
+        _recipients(50),
+        subjects=["Hi {{ name }}", "Quick question for {{ company }}"],
+        bodies=["<p>{{ opener }} {{ call_to_action }}</p>"],
+        salt="campaign-1",
+    )
+    assert len(emails) == 50
+    assert provider.calls == 2
+    assert "engineering velocity" in emails[0].html_body
+    assert {e.subject_variant for e in emails} == {"A", "B"}
+    assert {e.body_variant for e in emails} == {"A"}
+
+    # A fresh engine reuses the on-disk cache.
+    again = VariantEngine(provider, SnippetCache(str(tmp_path)))
+    again.render(_recipients(10), subjects=["Hi"], bodies=["{{ value_prop }}"])
+    assert provider.calls == 2
+
+
+def test_cache_ttl_and_lru_eviction(tmp_path):
+    now = [1000.0]
+    cache = SnippetCache(str(tmp_path), ttl=60, max_entries=2, clock=lambda: now[0])
+    cache.put("a", {"opener": "a"})
+    now[0] += 1
+    cache.put("b", {"opener": "b"})
+    now[0] += 1
+    assert cache.get("a") == {"opener": "a"}
+    now[0] += 1
+    cache.put("c", {"opener": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"opener": "a"}
+    now[0] += 120
+    assert cache.get("c") is None
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "not json",
+        "[1, 2]",
+        '{"created": 1000}',
+        '{"created": "yesterday", "snippets": {}}',
+        '{"created": 1000, "snippets": ["opener"]}',
+        '{"created": 1000, "snippets": {"opener": 1}}',
+    ],
+)
+def test_cache_treats_corrupt_entries_as_misses(tmp_path, content):
+    cache = SnippetCache(str(tmp_path), clock=lambda: 1000.0)
+    (tmp_path / "k.json").write_text(content)
+    assert cache.get("k") is None
+
+
+def test_cache_miss_when_entry_is_evicted_during_read(tmp_path, monkeypatch):
+    cache = SnippetCache(str(tmp_path), clock=lambda: 1000.0)
+    cache.put("k", {"opener": "hi"})
+
+    def evicted(path, times):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr("outreach_ai.variants.os.utime", evicted)
+    assert cache.get("k") is None
+
+def test_assign_variant_is_deterministic_and_weighted():
+    picks = [assign_variant("r%d" % i, 2, [9, 1]) for i in range(1000)]
+    assert picks == [assign_variant("r%d" % i, 2, [9, 1]) for i in range(1000)]
+    assert 850 < picks.count(0) < 950
+    assert variant_label(0) == "A"
+    assert variant_label(26) == "AA"
+
+
+def test_record_variants_feeds_variant_performance():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Campaign(id=1, name="Launch", subject="Hi", template_path="t.html"))
+    recipients = []
+    for i, data in enumerate(_recipients(20), start=1):
+        recipient = Recipient(id=i, **{k: v for k, v in data.items()})
+        recipients.append(recipient)
+        session.add(recipient)
+    # One message already queued; the rest are created by record_variants.
+    session.add(Message(campaign_id=1, recipient_id=1))
+    session.commit()
+
+    emails = VariantEngine().render(
+        recipients, subjects=["Hi {{ name }}", "Hello {{ name }}"], bodies=["{{ opener }}"], salt="1"
+    )
+    assert record_variants(session, 1, emails) == 20
+    session.commit()
+    assert session.query(Message).count() == 20
+
+    opened = {e.recipient.id for e in emails if e.subject_variant == "A"}
+    for message in session.query(Message):
+        if message.recipient_id in opened:
+            message.opened_at = datetime.utcnow()
+    session.commit()
+
+    report = variant_performance(session, campaign_id=1)
+    sent_a = report["subject"]["A"]["sent"]
+    assert sent_a == len(opened)
+    assert sent_a + report["subject"]["B"]["sent"] == 20
+    assert report["subject"]["A"]["open_rate"] == 100.0
+    assert report["subject"]["B"]["open_rate"] == 0.0
+    assert report["body"]["A"]["sent"] == 20
+    assert report["body"]["A"]["open_rate"] == pytest.approx(sent_a / 20 * 100)
+    assert variant_performance(session, campaign_id=2) == {"subject": {}, "body": {}}
+
+
+def test_snippet_provider_requires_generate():
+    class Incomplete(SnippetProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()